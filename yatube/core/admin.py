@@ -0,0 +1,159 @@
+from django import forms
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connection
+from django.db.models import Max, Min
+from django.db.models.functions import Substr
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+
+PREVIEW = '{}_preview'
+
+
+def estimate_rows(model):
+    """Примерное число строк таблицы без COUNT(*).
+
+    Берётся из статистики ANALYZE (sqlite_stat1), а если её ещё не
+    собирали — по границам первичного ключа, это два шага по индексу.
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+                [model._meta.db_table],
+            )
+            row = cursor.fetchone()
+    except DatabaseError:
+        row = None
+    if row:
+        return int(row[0].split()[0])
+    bounds = model._default_manager.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['high'] is None:
+        return 0
+    return bounds['high'] - bounds['low'] + 1
+
+
+class EstimatedCountPaginator(Paginator):
+    """Паджинатор списка админки для больших таблиц.
+
+    Для всей таблицы число строк оценивается по estimate_rows, а
+    отфильтрованная выборка досчитывается не дальше ADMIN_COUNT_LIMIT.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            return estimate_rows(queryset.model)
+        return queryset.order_by()[:settings.ADMIN_COUNT_LIMIT].count()
+
+
+class PreviewChangeList(ChangeList):
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        fields = self.model_admin.preview_fields
+        return queryset.annotate(**{
+            PREVIEW.format(name): Substr(
+                name, 1, settings.ADMIN_PREVIEW_LENGTH
+            )
+            for name in fields
+        }).defer(*fields)
+
+
+def preview_column(model, name):
+    def column(obj):
+        return getattr(obj, PREVIEW.format(name))
+    column.short_description = model._meta.get_field(name).verbose_name
+    column.admin_order_field = name
+    return column
+
+
+class ScalableAdminMixin:
+    """Список объектов, чья цена не растёт с размером таблицы.
+
+    Вместо точных COUNT(*) — оценка EstimatedCountPaginator, длинные
+    текстовые поля из preview_fields читаются из базы обрезанными через
+    substr, а в list_display остаются под своими именами.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    preview_fields = ()
+
+    def get_changelist(self, request, **kwargs):
+        return PreviewChangeList
+
+    def get_list_display(self, request):
+        return [
+            preview_column(self.model, name)
+            if name in self.preview_fields else name
+            for name in super().get_list_display(request)
+        ]
+
+
+class AutocompleteFilter(admin.FieldListFilter):
+    """Фильтр по внешнему ключу без списка всех значений.
+
+    Вместо перечня связанных объектов в боковой панели выводится поле
+    автокомплита: варианты подгружаются по мере ввода через
+    autocomplete_view админки связанной модели, не больше страницы
+    за раз. Связанная модель должна быть зарегистрирована в админке
+    с search_fields, а сама админка — подключать AutocompleteFilterMixin.
+
+    Использование: ``list_filter = (('author', AutocompleteFilter),)``.
+    """
+
+    template = 'core/admin/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin,
+                 field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.name}__exact'
+        self.lookup_val = params.get(self.lookup_kwarg)
+        super().__init__(
+            field, request, params, model, model_admin, field_path
+        )
+        self.form_field = forms.ModelChoiceField(
+            queryset=field.remote_field.model._default_manager.all(),
+            required=False,
+            widget=AutocompleteSelect(
+                field.remote_field,
+                model_admin.admin_site,
+                attrs={'class': 'autocomplete-filter', 'data-width': '100%'},
+            ),
+        )
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.lookup_val is None,
+            'query_string': changelist.get_query_string(
+                remove=[self.lookup_kwarg]
+            ),
+            'display': _('All'),
+        }
+
+    def render_widget(self):
+        # Из базы читается только выбранный объект, если он есть.
+        return self.form_field.widget.render(
+            self.lookup_kwarg, self.lookup_val
+        )
+
+
+class AutocompleteFilterMixin:
+    """Подключает к списку объектов скрипты для AutocompleteFilter."""
+
+    @property
+    def media(self):
+        return (
+            super().media
+            + AutocompleteSelect(None, self.admin_site).media
+            + forms.Media(js=['core/js/autocomplete_filter.js'])
+        )
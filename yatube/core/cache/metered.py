@@ -0,0 +1,68 @@
+"""Обёртка над любым бэкендом кэша, считающая попадания и промахи."""
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.module_loading import import_string
+
+from core import metrics
+
+MISSING = object()
+
+
+class MeteredCache(BaseCache):
+    """Передаёт вызовы бэкенду из OPTIONS['BACKEND'], остальные OPTIONS
+    достаются ему же. Чтения отмечаются в метриках текущего запроса.
+    """
+
+    def __init__(self, location, params):
+        params = dict(params)
+        options = dict(params.get('OPTIONS', {}))
+        backend = import_string(options.pop('BACKEND'))
+        params['OPTIONS'] = options
+        super().__init__(params)
+        self.backend = backend(location, params)
+
+    def get(self, key, default=None, version=None):
+        value = self.backend.get(key, MISSING, version)
+        if value is MISSING:
+            metrics.cache_lookup(0, 1)
+            return default
+        metrics.cache_lookup(1, 0)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = self.backend.get_many(keys, version)
+        metrics.cache_lookup(len(found), len(keys) - len(found))
+        return found
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.backend.add(key, value, timeout, version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.backend.set(key, value, timeout, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.backend.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        return self.backend.delete(key, version)
+
+    def has_key(self, key, version=None):
+        return self.backend.has_key(key, version)
+
+    def incr(self, key, delta=1, version=None):
+        return self.backend.incr(key, delta, version)
+
+    def decr(self, key, delta=1, version=None):
+        return self.backend.decr(key, delta, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.backend.set_many(data, timeout, version)
+
+    def delete_many(self, keys, version=None):
+        return self.backend.delete_many(keys, version)
+
+    def clear(self):
+        return self.backend.clear()
+
+    def close(self, **kwargs):
+        return self.backend.close(**kwargs)
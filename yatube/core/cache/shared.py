@@ -0,0 +1,288 @@
+"""Кэш в файле, отображённом в память, общий для процессов одного узла.
+
+Файл разбит на слоты фиксированного размера, сгруппированные по WAYS
+в корзины: ключ попадает в корзину по хэшу и ищется только среди её
+слотов. Корзины блокируются по отдельности диапазонными блокировками
+fcntl, поэтому воркеры gunicorn почти не мешают друг другу. Когда в
+корзине нет свободного слота, жертву выбирает алгоритм часов: слоты,
+к которым обращались после прошлого прохода стрелки, получают второй шанс.
+
+Файл создаётся разреженным: в памяти оказываются только страницы,
+в которые действительно что-то записано, так что короткие значения не
+занимают весь слот.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+MAGIC = b'YTBCACHE'
+FILE_HEADER = struct.Struct('<8sIII')
+FILE_HEADER_SIZE = 64
+FORMAT_VERSION = 1
+# Хэш ключа, срок жизни (0 — бессрочно), длина данных, занят, бит часов.
+SLOT_HEADER = struct.Struct('<16sdIBB')
+USED = SLOT_HEADER.size - 2
+REFERENCED = SLOT_HEADER.size - 1
+WAYS = 8
+THREAD_LOCKS = 64
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+class Table:
+    """Отображённый в память файл кэша.
+
+    Один объект на файл и процесс: блокировки fcntl принадлежат процессу,
+    а не потоку, поэтому потоки дополнительно разводятся своими замками.
+    """
+
+    def __init__(self, path, slots, slot_size):
+        self.buckets = max(1, -(-slots // WAYS))
+        self.slots = self.buckets * WAYS
+        self.slot_size = slot_size
+        self.capacity = slot_size - SLOT_HEADER.size
+        self.hands = FILE_HEADER_SIZE
+        self.first_slot = self.hands + mmap.PAGESIZE * (
+            -(-self.buckets // mmap.PAGESIZE)
+        )
+        size = self.first_slot + self.slots * slot_size
+        # Размеры и версия формата входят в имя файла: процессы с другой
+        # конфигурацией открывают свой файл, а не обрезают чужой, который
+        # кто-то ещё держит отображённым (обращение за его конец — SIGBUS).
+        self.path = f'{path}.{self.slots}x{slot_size}.v{FORMAT_VERSION}'
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        header = FILE_HEADER.pack(
+            MAGIC, FORMAT_VERSION, self.slots, slot_size
+        )
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, FILE_HEADER_SIZE, 0)
+        try:
+            if not os.fstat(self.fd).st_size:
+                os.ftruncate(self.fd, size)
+                os.pwrite(self.fd, header, 0)
+            current = os.pread(self.fd, FILE_HEADER.size, 0)
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, FILE_HEADER_SIZE, 0)
+        if current != header:
+            os.close(self.fd)
+            raise ImproperlyConfigured(
+                f'{self.path}: заголовок не совпадает с настройками кэша, '
+                f'файл повреждён; остановите воркеры и удалите его'
+            )
+        self.map = mmap.mmap(self.fd, size)
+        self.thread_locks = [threading.Lock() for _ in range(THREAD_LOCKS)]
+
+    def bucket(self, digest):
+        return int.from_bytes(digest[:8], 'little') % self.buckets
+
+    def offset(self, index):
+        return self.first_slot + index * self.slot_size
+
+    @contextmanager
+    def locked(self, bucket, shared=False):
+        start = self.offset(bucket * WAYS)
+        length = WAYS * self.slot_size
+        with self.thread_locks[bucket % THREAD_LOCKS]:
+            fcntl.lockf(
+                self.fd,
+                fcntl.LOCK_SH if shared else fcntl.LOCK_EX,
+                length,
+                start,
+            )
+            try:
+                yield
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, length, start)
+
+    def header(self, index):
+        return SLOT_HEADER.unpack_from(self.map, self.offset(index))
+
+    def find(self, bucket, digest, now):
+        """Индекс живого слота с ключом или None; корзина заблокирована."""
+        for index in range(bucket * WAYS, (bucket + 1) * WAYS):
+            slot_digest, expires, _, used, _ = self.header(index)
+            if used and slot_digest == digest and (
+                not expires or expires > now
+            ):
+                return index
+        return None
+
+    def victim(self, bucket, now):
+        """Свободный или просроченный слот, иначе выбор стрелкой часов."""
+        first = bucket * WAYS
+        for index in range(first, first + WAYS):
+            _, expires, _, used, _ = self.header(index)
+            if not used or (expires and expires <= now):
+                return index
+        hand = self.map[self.hands + bucket]
+        for step in range(2 * WAYS):
+            index = first + (hand + step) % WAYS
+            referenced = self.offset(index) + REFERENCED
+            if not self.map[referenced]:
+                break
+            self.map[referenced] = 0
+        self.map[self.hands + bucket] = (index - first + 1) % WAYS
+        return index
+
+    def read(self, index):
+        offset = self.offset(index)
+        self.map[offset + REFERENCED] = 1
+        length = self.header(index)[2]
+        start = offset + SLOT_HEADER.size
+        return self.map[start:start + length]
+
+    def write(self, index, digest, data, expires):
+        offset = self.offset(index)
+        start = offset + SLOT_HEADER.size
+        self.map[start:start + len(data)] = data
+        SLOT_HEADER.pack_into(
+            self.map, offset, digest, expires, len(data), 1, 1
+        )
+
+    def load(self, digest):
+        bucket = self.bucket(digest)
+        with self.locked(bucket, shared=True):
+            index = self.find(bucket, digest, time.time())
+            return None if index is None else self.read(index)
+
+    def store(self, digest, data, expires, replace=True):
+        if len(data) > self.capacity:
+            if replace:
+                self.delete(digest)
+            return False
+        bucket = self.bucket(digest)
+        with self.locked(bucket):
+            now = time.time()
+            index = self.find(bucket, digest, now)
+            if index is None:
+                index = self.victim(bucket, now)
+            elif not replace:
+                return False
+            self.write(index, digest, data, expires)
+        return True
+
+    def touch(self, digest, expires):
+        bucket = self.bucket(digest)
+        with self.locked(bucket):
+            index = self.find(bucket, digest, time.time())
+            if index is None:
+                return False
+            struct.pack_into('<d', self.map, self.offset(index) + 16, expires)
+        return True
+
+    def delete(self, digest):
+        bucket = self.bucket(digest)
+        with self.locked(bucket):
+            index = self.find(bucket, digest, time.time())
+            if index is None:
+                return False
+            self.map[self.offset(index) + USED] = 0
+        return True
+
+    def clear(self):
+        for bucket in range(self.buckets):
+            with self.locked(bucket):
+                for index in range(bucket * WAYS, (bucket + 1) * WAYS):
+                    self.map[self.offset(index) + USED] = 0
+
+
+def get_table(path, slots, slot_size):
+    # После fork открываем файл заново: замки потоков и fcntl
+    # не переходят в дочерний процесс.
+    key = (path, slots, slot_size, os.getpid())
+    with _tables_lock:
+        if key not in _tables:
+            _tables[key] = Table(path, slots, slot_size)
+        return _tables[key]
+
+
+class SharedMemoryCache(BaseCache):
+    """Бэкенд кэша Django поверх Table.
+
+    LOCATION — начало имени файла, относительный путь считается от
+    BASE_DIR; к нему добавляются размеры и версия формата (см. Table).
+    OPTIONS: SLOTS — число слотов, SLOT_SIZE — размер слота в байтах;
+    значения длиннее слота не кэшируются.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = os.path.join(settings.BASE_DIR, location)
+        self._slots = int(options.get('SLOTS', 4096))
+        self._slot_size = int(options.get('SLOT_SIZE', 64 * 1024))
+
+    @property
+    def _table(self):
+        return get_table(self._path, self._slots, self._slot_size)
+
+    def _digest(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout) or 0.0
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._table.store(
+            self._digest(key, version),
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+            self._expires(timeout),
+            replace=False,
+        )
+
+    def get(self, key, default=None, version=None):
+        data = self._table.load(self._digest(key, version))
+        return default if data is None else pickle.loads(data)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._table.store(
+            self._digest(key, version),
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+            self._expires(timeout),
+        )
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._table.touch(
+            self._digest(key, version), self._expires(timeout)
+        )
+
+    def delete(self, key, version=None):
+        return self._table.delete(self._digest(key, version))
+
+    def has_key(self, key, version=None):
+        return self._table.load(self._digest(key, version)) is not None
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно для всех процессов: чтение и запись под одной
+        блокировкой корзины."""
+        table = self._table
+        digest = self._digest(key, version)
+        bucket = table.bucket(digest)
+        with table.locked(bucket):
+            index = table.find(bucket, digest, time.time())
+            if index is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(table.read(index)) + delta
+            table.write(
+                index,
+                digest,
+                pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                table.header(index)[1],
+            )
+        return value
+
+    def clear(self):
+        self._table.clear()
@@ -0,0 +1,110 @@
+import os
+import random
+import shutil
+import tempfile
+import time
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'filebased': 'django.core.cache.backends.filebased.FileBasedCache',
+    'shared': 'core.cache.shared.SharedMemoryCache',
+}
+# Запись sorl-thumbnail и закэшированная страница ленты.
+VALUES = {
+    'small': 'x' * 200,
+    'page': 'x' * 20 * 1024,
+}
+
+
+def make_cache(name, directory, keys):
+    location = {
+        'locmem': 'benchmark',
+        'filebased': os.path.join(directory, 'files'),
+        'shared': os.path.join(directory, 'shared.cache'),
+    }[name]
+    return import_string(BACKENDS[name])(location, {
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': keys * 2, 'SLOTS': keys * 2},
+    })
+
+
+def single(name, directory, keys, value):
+    """Скорость set и get по всем ключам в одном процессе."""
+    cache = make_cache(name, directory, keys)
+    cache.clear()
+    started = time.perf_counter()
+    for key in range(keys):
+        cache.set(f'key:{key}', value)
+    set_rate = keys / (time.perf_counter() - started)
+    started = time.perf_counter()
+    for key in range(keys):
+        cache.get(f'key:{key}')
+    get_rate = keys / (time.perf_counter() - started)
+    return set_rate, get_rate
+
+
+def worker(args):
+    """Чтение со сбором промахов, как у вьюхи с кэшем страницы."""
+    name, directory, keys, value, operations, seed = args
+    cache = make_cache(name, directory, keys)
+    chooser = random.Random(seed)
+    hits = 0
+    started = time.perf_counter()
+    for _ in range(operations):
+        key = f'key:{chooser.randrange(keys)}'
+        if cache.get(key) is None:
+            cache.set(key, value)
+        else:
+            hits += 1
+    return hits, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает бэкенды кэша: скорость в одном процессе и долю '
+        'попаданий, когда кэш читают несколько процессов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keys', type=int, default=2000)
+        parser.add_argument('--operations', type=int, default=20000)
+        parser.add_argument(
+            '--processes', type=int, nargs='+', default=[1, 4]
+        )
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        try:
+            for size, value in VALUES.items():
+                for name in BACKENDS:
+                    self.run(name, directory, size, value, options)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def run(self, name, directory, size, value, options):
+        keys = options['keys']
+        set_rate, get_rate = single(name, directory, keys, value)
+        self.stdout.write(
+            f'{name:<10} {size:<6} set {set_rate:>10.0f}/с '
+            f'get {get_rate:>10.0f}/с'
+        )
+        for processes in options['processes']:
+            make_cache(name, directory, keys).clear()
+            jobs = [
+                (name, directory, keys, value, options['operations'], seed)
+                for seed in range(processes)
+            ]
+            with Pool(processes) as pool:
+                results = pool.map(worker, jobs)
+            hits = sum(hit for hit, _ in results)
+            elapsed = max(seconds for _, seconds in results)
+            total = options['operations'] * processes
+            self.stdout.write(
+                f'{"":<17} процессов {processes}: '
+                f'{total / elapsed:>10.0f} оп./с, '
+                f'попаданий {hits * 100 / total:.1f}%'
+            )
@@ -0,0 +1,56 @@
+import pstats
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import parse_name, profiles
+
+
+class Command(BaseCommand):
+    help = (
+        'Объединяет сохранённые профили по вьюхам и печатает самые '
+        'затратные функции каждой.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir', help='Каталог профилей, по умолчанию PROFILE_DIR.'
+        )
+        parser.add_argument(
+            '--view',
+            help='Только эта вьюха, например posts:profile.',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=15,
+            help='Сколько функций показывать для каждой вьюхи.',
+        )
+        parser.add_argument(
+            '--sort',
+            choices=('cumulative', 'tottime', 'ncalls'),
+            default='cumulative',
+        )
+
+    def handle(self, *args, **options):
+        by_view = defaultdict(list)
+        for path in profiles(options['dir']):
+            view, seconds = parse_name(path)
+            by_view[view].append((seconds, path))
+        if options['view']:
+            view = options['view'].replace(':', '.')
+            by_view = {view: by_view.get(view, [])}
+        if not any(by_view.values()):
+            raise CommandError('Профилей не найдено.')
+        for view, samples in sorted(by_view.items()):
+            latencies = sorted(seconds for seconds, _ in samples)
+            self.stdout.write(
+                f'== {view}: профилей {len(samples)}, медиана '
+                f'{latencies[len(latencies) // 2] * 1000:.0f} мс, максимум '
+                f'{latencies[-1] * 1000:.0f} мс'
+            )
+            stats = pstats.Stats(
+                *(path for _, path in samples), stream=self.stdout
+            )
+            stats.strip_dirs().sort_stats(options['sort'])
+            stats.print_stats(options['limit'])
@@ -0,0 +1,75 @@
+import glob
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+ORDERINGS = {
+    'total': lambda stats: stats['total'],
+    'max': lambda stats: stats['max'],
+    'count': lambda stats: stats['count'],
+}
+
+
+def read_entries(path):
+    """Записи журнала вместе с файлами после ротации (.1, .2, ...)."""
+    paths = sorted(glob.glob(f'{glob.escape(path)}.*'), reverse=True)
+    for name in paths + glob.glob(glob.escape(path)):
+        with open(name, encoding='utf-8') as stream:
+            for line in stream:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводка журнала медленных запросов: нормализованные запросы '
+        'по суммарному времени, с вьюхами и последним планом.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file', help='Журнал, по умолчанию SLOW_QUERY_LOG.'
+        )
+        parser.add_argument('--view', help='Только запросы этой вьюхи.')
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument(
+            '--sort', choices=tuple(ORDERINGS), default='total'
+        )
+
+    def handle(self, *args, **options):
+        statements = defaultdict(lambda: {
+            'count': 0, 'total': 0.0, 'max': 0.0, 'views': set(),
+        })
+        for entry in read_entries(options['file'] or settings.SLOW_QUERY_LOG):
+            if options['view'] and entry['view'] != options['view']:
+                continue
+            stats = statements[entry['statement']]
+            stats['count'] += 1
+            stats['total'] += entry['duration']
+            stats['max'] = max(stats['max'], entry['duration'])
+            stats['views'].add(entry['view'] or '-')
+            stats['plan'] = entry['plan']
+            stats['stack'] = entry['stack']
+        if not statements:
+            raise CommandError('Медленных запросов не найдено.')
+        ranked = sorted(
+            statements.items(),
+            key=lambda item: ORDERINGS[options['sort']](item[1]),
+            reverse=True,
+        )
+        for statement, stats in ranked[:options['limit']]:
+            self.stdout.write(
+                f'{stats["count"]} раз, всего {stats["total"] * 1000:.0f} мс, '
+                f'среднее {stats["total"] / stats["count"] * 1000:.0f} мс, '
+                f'максимум {stats["max"] * 1000:.0f} мс; '
+                f'вьюхи: {", ".join(sorted(stats["views"]))}'
+            )
+            self.stdout.write(f'  {statement}')
+            for line in stats['plan']:
+                self.stdout.write(f'    план: {line}')
+            for line in stats['stack'][-2:]:
+                self.stdout.write(f'    из: {line}')
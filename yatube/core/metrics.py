@@ -0,0 +1,226 @@
+"""Метрики запросов: время в базе, кэше и шаблонах, гистограммы вьюх.
+
+Пока идёт запрос, его показатели копятся в RequestMetrics текущего
+потока. После ответа они добавляются к счётчикам процесса, а те раз в
+METRICS_FLUSH_INTERVAL секунд сохраняются в METRICS_DIR/<pid>.json.
+Страница /metrics складывает файлы всех воркеров, поэтому видит сумму
+по узлу, сколько бы процессов ни запустил WSGI-сервер. Счётчики
+накопительные: каталог очищают при перезапуске сервиса.
+"""
+import atexit
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+COUNTERS = {
+    'db_queries': ('yatube_db_queries_total', 'Запросы к базе.'),
+    'db_seconds': ('yatube_db_seconds_total', 'Время запросов к базе.'),
+    'cache_hits': ('yatube_cache_hits_total', 'Попадания в кэш.'),
+    'cache_misses': ('yatube_cache_misses_total', 'Промахи кэша.'),
+    'template_seconds': (
+        'yatube_template_seconds_total', 'Время отрисовки шаблонов.'
+    ),
+}
+HISTOGRAM = 'yatube_view_duration_seconds'
+
+_local = threading.local()
+
+
+class RequestMetrics:
+    """Показатели одного запроса; сам объект — execute_wrapper базы."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_seconds = 0.0
+        self.rendering = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_seconds += time.perf_counter() - started
+
+    @property
+    def seconds(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Значение заголовка Server-Timing, длительности в мс."""
+        return ', '.join((
+            f'db;dur={self.db_seconds * 1000:.1f};'
+            f'desc="{self.db_queries} queries"',
+            f'cache;desc="{self.cache_hits} hits {self.cache_misses} misses"',
+            f'tpl;dur={self.template_seconds * 1000:.1f}',
+            f'total;dur={self.seconds * 1000:.1f}',
+        ))
+
+
+def current():
+    return getattr(_local, 'request', None)
+
+
+@contextmanager
+def collect():
+    """Собирает показатели запроса, выполняемого внутри блока."""
+    metrics = RequestMetrics()
+    _local.request = metrics
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics))
+            yield metrics
+    finally:
+        _local.request = None
+
+
+def cache_lookup(hits, misses):
+    metrics = current()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+@contextmanager
+def template_timer():
+    """Засекает отрисовку шаблона; вложенные отрисовки не суммируются."""
+    metrics = current()
+    if metrics is None:
+        yield
+        return
+    metrics.rendering += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.rendering -= 1
+        if not metrics.rendering:
+            metrics.template_seconds += time.perf_counter() - started
+
+
+class Registry:
+    """Накопленные метрики процесса по вьюхам."""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.views = {}
+        self.flushed = time.monotonic()
+        self.lock = threading.Lock()
+
+    @property
+    def path(self):
+        return os.path.join(settings.METRICS_DIR, f'{self.pid}.json')
+
+    def observe(self, view, metrics):
+        seconds = metrics.seconds
+        with self.lock:
+            stats = self.views.setdefault(view, {
+                'buckets': [0] * len(settings.METRICS_BUCKETS),
+                'count': 0,
+                'sum': 0.0,
+                **dict.fromkeys(COUNTERS, 0),
+            })
+            for index, bound in enumerate(settings.METRICS_BUCKETS):
+                if seconds <= bound:
+                    stats['buckets'][index] += 1
+                    break
+            stats['count'] += 1
+            stats['sum'] += seconds
+            for name in COUNTERS:
+                stats[name] += getattr(metrics, name)
+        if time.monotonic() - self.flushed >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            data = json.dumps({
+                'buckets': list(settings.METRICS_BUCKETS),
+                'views': self.views,
+            })
+            self.flushed = time.monotonic()
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        # Читатель видит либо старый файл, либо новый целиком.
+        descriptor, temporary = tempfile.mkstemp(dir=settings.METRICS_DIR)
+        with os.fdopen(descriptor, 'w') as stream:
+            stream.write(data)
+        os.replace(temporary, self.path)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def registry():
+    """Счётчики текущего процесса; у форка они свои, с нуля."""
+    global _registry
+    with _registry_lock:
+        if _registry is None or _registry.pid != os.getpid():
+            _registry = Registry()
+            atexit.register(_registry.flush)
+        return _registry
+
+
+def load():
+    """Сумма метрик всех процессов, сохранивших их в METRICS_DIR."""
+    views = {}
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+        try:
+            with open(path) as stream:
+                data = json.load(stream)
+        except (OSError, ValueError):
+            continue
+        if data['buckets'] != list(settings.METRICS_BUCKETS):
+            continue
+        for view, stats in data['views'].items():
+            total = views.setdefault(view, {
+                'buckets': [0] * len(stats['buckets']),
+                'count': 0,
+                'sum': 0.0,
+                **dict.fromkeys(COUNTERS, 0),
+            })
+            for index, count in enumerate(stats['buckets']):
+                total['buckets'][index] += count
+            for name in ('count', 'sum', *COUNTERS):
+                total[name] += stats[name]
+    return views
+
+
+def render(views):
+    """Метрики в текстовом формате Prometheus."""
+    lines = [
+        f'# HELP {HISTOGRAM} Время ответа вьюхи.',
+        f'# TYPE {HISTOGRAM} histogram',
+    ]
+    for view, stats in sorted(views.items()):
+        label = f'view="{view}"'
+        cumulative = 0
+        for bound, count in zip(settings.METRICS_BUCKETS, stats['buckets']):
+            cumulative += count
+            lines.append(
+                f'{HISTOGRAM}_bucket{{{label},le="{bound}"}} {cumulative}'
+            )
+        lines += [
+            f'{HISTOGRAM}_bucket{{{label},le="+Inf"}} {stats["count"]}',
+            f'{HISTOGRAM}_sum{{{label}}} {stats["sum"]}',
+            f'{HISTOGRAM}_count{{{label}}} {stats["count"]}',
+        ]
+    for name, (metric, description) in COUNTERS.items():
+        lines += [
+            f'# HELP {metric} {description}',
+            f'# TYPE {metric} counter',
+        ]
+        for view, stats in sorted(views.items()):
+            lines.append(f'{metric}{{view="{view}"}} {stats[name]}')
+    return '\n'.join(lines) + '\n'
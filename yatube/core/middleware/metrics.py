@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from core import metrics
+
+
+class MetricsMiddleware:
+    """Метрики каждого запроса: заголовок Server-Timing и счётчики
+    процесса по имени вьюхи для страницы /metrics.
+
+    Стоит первым в MIDDLEWARE, чтобы время включало остальные слои.
+    У потоковых ответов учитывается время до начала отдачи.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with metrics.collect() as collected:
+            response = self.get_response(request)
+        match = request.resolver_match
+        # Неразобранные адреса сводятся к одной метке, чтобы мусорные
+        # запросы не плодили ряды метрик.
+        view = match.view_name if match else 'unresolved'
+        metrics.registry().observe(view, collected)
+        response['Server-Timing'] = collected.server_timing()
+        return response
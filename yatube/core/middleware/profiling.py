@@ -0,0 +1,49 @@
+import cProfile
+import os
+import random
+import time
+
+from django.conf import settings
+
+from core import profiling
+
+
+class ProfilingMiddleware:
+    """Профилирует cProfile долю PROFILE_SAMPLE_RATE запросов, а также
+    запросы с подписанным заголовком X-Profile (см. make_profile_token).
+
+    Профиль сохраняется в PROFILE_DIR, его имя возвращается в заголовке
+    X-Profile ответа. Сводку по вьюхам печатает profile_summary.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def sampled(self, request):
+        token = request.META.get('HTTP_X_PROFILE')
+        if token:
+            return profiling.check_token(token)
+        return random.random() < settings.PROFILE_SAMPLE_RATE
+
+    def __call__(self, request):
+        if not self.sampled(request):
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # В потоке уже работает другой профилировщик.
+            return self.get_response(request)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        match = request.resolver_match
+        path = profiling.save(
+            profiler,
+            match.view_name if match else 'unresolved',
+            time.perf_counter() - started,
+        )
+        response['X-Profile'] = os.path.basename(path)
+        return response
@@ -0,0 +1,48 @@
+import logging
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from core.queries import record_queries
+
+logger = logging.getLogger('yatube.queries')
+
+
+class QueryReportMiddleware:
+    """Отчёт о запросах к базе для каждой страницы, только при DEBUG.
+
+    Число и время запросов уходят в заголовки X-Query-Count и
+    X-Query-Time. Если какой-то запрос повторился подозрительно много
+    раз, это N+1: отчёт пишется в лог, а в HTML-страницу добавляется
+    комментарием перед </body>.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DEBUG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with record_queries() as log:
+            response = self.get_response(request)
+        response['X-Query-Count'] = len(log)
+        response['X-Query-Time'] = f'{log.duration * 1000:.1f}ms'
+        repeated = log.repeated()
+        if not repeated:
+            return response
+        response['X-Query-Repeated'] = len(repeated)
+        report = log.report()
+        logger.warning('Повторяющиеся запросы на %s\n%s', request.path, report)
+        if (
+            not response.streaming
+            and response.get('Content-Type', '').startswith('text/html')
+        ):
+            comment = '\n<!-- N+1\n{}\n-->\n'.format(
+                report.replace('--', '- -')
+            ).encode()
+            response.content = response.content.replace(
+                b'</body>', comment + b'</body>', 1
+            )
+            if response.has_header('Content-Length'):
+                response['Content-Length'] = len(response.content)
+        return response
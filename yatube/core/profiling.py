@@ -0,0 +1,79 @@
+"""Профили cProfile выборочных запросов, сохранённые на диск.
+
+Файл профиля называется <вьюха>__<мс>ms__<время>__<pid>.prof, так что
+вьюху и время ответа видно без загрузки профиля. Раз в
+PROFILE_PRUNE_EVERY сохранений в каталоге остаются только PROFILE_KEEP
+самых свежих файлов; свежесть читается из имени, без stat, а файлы,
+которые успел удалить другой процесс, пропускаются.
+"""
+import glob
+import itertools
+import os
+from datetime import datetime
+
+from django.conf import settings
+from django.core import signing
+
+EXTENSION = '.prof'
+SALT = 'core.profiling'
+
+_saves = itertools.count(1)
+
+
+def make_token():
+    """Значение заголовка X-Profile, действует PROFILE_TOKEN_MAX_AGE."""
+    return signing.TimestampSigner(salt=SALT).sign('profile')
+
+
+def check_token(token):
+    try:
+        signing.TimestampSigner(salt=SALT).unsign(
+            token, max_age=settings.PROFILE_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def profile_name(view, seconds):
+    return '__'.join((
+        view.replace(':', '.'),
+        f'{seconds * 1000:.0f}ms',
+        datetime.now().strftime('%Y%m%d-%H%M%S-%f'),
+        str(os.getpid()),
+    )) + EXTENSION
+
+
+def parse_name(path):
+    """Вьюха и время ответа в секундах по имени файла профиля."""
+    view, latency = os.path.basename(path).split('__')[:2]
+    return view, int(latency[:-2]) / 1000
+
+
+def saved_at(path):
+    """Время сохранения и pid из имени файла профиля."""
+    return os.path.basename(path).rsplit('__', 2)[1:]
+
+
+def profiles(directory=None):
+    """Файлы профилей от старых к новым."""
+    pattern = os.path.join(directory or settings.PROFILE_DIR, '*' + EXTENSION)
+    return sorted(glob.glob(pattern), key=saved_at)
+
+
+def prune():
+    for old in profiles()[:-settings.PROFILE_KEEP]:
+        try:
+            os.remove(old)
+        except OSError:
+            # Файл уже удалил другой процесс.
+            pass
+
+
+def save(profiler, view, seconds):
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    path = os.path.join(settings.PROFILE_DIR, profile_name(view, seconds))
+    profiler.dump_stats(path)
+    if next(_saves) % settings.PROFILE_PRUNE_EVERY == 0:
+        prune()
+    return path
@@ -0,0 +1,66 @@
+"""Запись SQL-запросов и поиск повторяющихся (N+1)."""
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'\b\d+\b')
+PLACEHOLDERS = re.compile(r'\(\?(?:\s*,\s*\?)*\)')
+
+
+def normalize(sql):
+    """Текст запроса без значений: одинаковые запросы с разными
+    параметрами и разной длиной IN (...) дают одну строку."""
+    sql = STRING.sub('?', sql.replace('%s', '?'))
+    return PLACEHOLDERS.sub('(...)', NUMBER.sub('?', sql))
+
+
+class QueryLog:
+    """execute_wrapper, который запоминает каждый запрос и его время."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    def __len__(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(duration for _, duration in self.queries)
+
+    def groups(self):
+        return Counter(normalize(sql) for sql, _ in self.queries)
+
+    def repeated(self):
+        """Запросы, выполненные не меньше QUERY_REPEAT_THRESHOLD раз."""
+        return [
+            (sql, count) for sql, count in self.groups().most_common()
+            if count >= settings.QUERY_REPEAT_THRESHOLD
+        ]
+
+    def report(self):
+        lines = [f'{len(self)} запросов, {self.duration * 1000:.1f} мс']
+        for sql, count in self.groups().most_common():
+            lines.append(f'{count:>4} × {sql}')
+        return '\n'.join(lines)
+
+
+@contextmanager
+def record_queries():
+    """Записывает запросы ко всем базам внутри блока."""
+    log = QueryLog()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(log))
+        yield log
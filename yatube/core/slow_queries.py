@@ -0,0 +1,96 @@
+"""Журнал медленных запросов с планом выполнения.
+
+Запрос дольше SLOW_QUERY_THRESHOLD секунд пишется в логгер
+yatube.slow_queries одной JSON-строкой. В строке будут время, текст и
+нормализованный вид запроса, EXPLAIN, вьюха и кадры стека из кода
+проекта. В settings.LOGGING логгер пишет в файл с ротацией, а сводку
+по нему печатает команда slow_queries.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.queries import normalize
+
+logger = logging.getLogger('yatube.slow_queries')
+_local = threading.local()
+
+
+def current_view():
+    return getattr(_local, 'view', None)
+
+
+def set_view(name):
+    _local.view = name
+
+
+def explain(connection, sql, params):
+    # Сырой курсор бэкенда не проходит через execute_wrappers,
+    # поэтому EXPLAIN не попадает в журнал сам.
+    try:
+        cursor = connection.create_cursor()
+        try:
+            cursor.execute(
+                f'{connection.ops.explain_query_prefix()} {sql}', params
+            )
+            return [str(row[-1]) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+    except Exception as error:
+        return [f'EXPLAIN не удался: {error}']
+
+
+def stack_excerpt():
+    """Последние кадры стека из кода проекта, без библиотек."""
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if frame.filename.startswith(settings.BASE_DIR)
+        and frame.filename != __file__
+        and 'site-packages' not in frame.filename
+    ]
+    return [
+        f'{os.path.relpath(frame.filename, settings.BASE_DIR)}:'
+        f'{frame.lineno} {frame.name}'
+        for frame in frames[-settings.SLOW_QUERY_STACK_DEPTH:]
+    ]
+
+
+def log_slow_queries(execute, sql, params, many, context):
+    """execute_wrapper, который пишет в журнал медленные запросы."""
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        if duration >= settings.SLOW_QUERY_THRESHOLD:
+            connection = context['connection']
+            logger.warning(json.dumps({
+                'time': timezone.now().isoformat(),
+                'database': connection.alias,
+                'duration': duration,
+                'statement': normalize(sql),
+                'sql': sql,
+                'params': repr(params)[:500],
+                'plan': [] if many else explain(connection, sql, params),
+                'view': current_view(),
+                'stack': stack_excerpt(),
+            }, ensure_ascii=False))
+
+
+def install(sender, connection, **kwargs):
+    """Обработчик connection_created: подключает журнал к соединению.
+
+    Обёртка ставится в начало списка: execute_wrapper() снимает
+    с конца, и временные обёртки не заберут её с собой.
+    """
+    if (
+        connection.alias in settings.SLOW_QUERY_DATABASES
+        and log_slow_queries not in connection.execute_wrappers
+    ):
+        connection.execute_wrappers.insert(0, log_slow_queries)
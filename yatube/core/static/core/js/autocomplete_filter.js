@@ -0,0 +1,14 @@
+'use strict';
+// Выбор в фильтре-автокомплите сразу применяет его к списку объектов.
+(function($) {
+    $(document).on('change', 'select.autocomplete-filter', function() {
+        var params = new URLSearchParams(window.location.search);
+        if (this.value) {
+            params.set(this.name, this.value);
+        } else {
+            params.delete(this.name);
+        }
+        params.delete('p');
+        window.location.search = params.toString();
+    });
+})(django.jQuery);
@@ -0,0 +1,23 @@
+from django.template.backends.django import DjangoTemplates, Template
+
+from core import metrics
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        with metrics.template_timer():
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates, замеряющий отрисовку для метрик запроса."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(
+            super().from_string(template_code).template, self
+        )
+
+    def get_template(self, template_name):
+        return TimedTemplate(
+            super().get_template(template_name).template, self
+        )
@@ -0,0 +1,23 @@
+from core.queries import record_queries
+
+
+class QueryBudgetMixin:
+    """Бюджеты запросов к базе для тестов страниц.
+
+    assertQueryBudget открывает страницу и падает, если запросов больше
+    бюджета или среди них есть повторяющиеся (N+1); в сообщении —
+    сгруппированный отчёт по запросам.
+    """
+
+    def assertQueryBudget(self, url, budget, client=None):
+        client = client or self.client
+        with record_queries() as log:
+            response = client.get(url)
+        if len(log) > budget:
+            self.fail(
+                f'{url}: {len(log)} запросов при бюджете {budget}\n'
+                f'{log.report()}'
+            )
+        if log.repeated():
+            self.fail(f'{url}: повторяющиеся запросы\n{log.report()}')
+        return response
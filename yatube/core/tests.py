@@ -1,6 +1,22 @@
+import json
+import os
+import shutil
+import tempfile
+import time
 from http import HTTPStatus
+from io import StringIO
+from multiprocessing import Process
+from unittest import mock
 
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+
+from . import metrics, profiling
+from .cache.shared import SharedMemoryCache, Table, WAYS
+from .queries import normalize, record_queries
 
 
 class ViewTestClass(TestCase):
@@ -8,3 +24,288 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+def shared_cache(location, **options):
+    return SharedMemoryCache(location, {'OPTIONS': options})
+
+
+def set_in_child(location, key, value):
+    shared_cache(location).set(key, value)
+
+
+class SharedMemoryCacheTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = f'{self.directory}/cache'
+        self.cache = shared_cache(self.location)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_basic_operations(self):
+        """Бэкенд ведёт себя как обычный кэш Django."""
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertFalse(self.cache.add('key', 'другое'))
+        self.assertTrue(self.cache.add('new', 'значение'))
+        self.assertEqual(self.cache.get_many(['key', 'new', 'missing']), {
+            'key': {'value': 1}, 'new': 'значение',
+        })
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter', 5), 6)
+        self.assertEqual(self.cache.decr('counter'), 5)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.cache.clear()
+        self.assertFalse(self.cache.has_key('new'))
+
+    def test_geometry_in_file_name(self):
+        """Кэш с другими размерами открывает свой файл и не обрезает
+        чужой; файл с испорченным заголовком не трогается."""
+        self.cache.set('key', 'значение')
+        other = shared_cache(self.location, SLOTS=WAYS, SLOT_SIZE=4096)
+        other.set('key', 'другое')
+        self.assertEqual(self.cache.get('key'), 'значение')
+        self.assertEqual(other.get('key'), 'другое')
+        path = other._table.path
+        with open(path, 'r+b') as file:
+            file.write(b'XXXXXXXX')
+        size = os.path.getsize(path)
+        with self.assertRaises(ImproperlyConfigured):
+            Table(self.location, WAYS, 4096)
+        self.assertEqual(os.path.getsize(path), size)
+
+    def test_expiration(self):
+        """Просроченные значения не возвращаются, touch продлевает срок."""
+        self.cache.set('short', 1, 0.05)
+        self.cache.set('touched', 1, 0.05)
+        self.assertTrue(self.cache.touch('touched', None))
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertEqual(self.cache.get('touched'), 1)
+
+    def test_shared_between_processes(self):
+        """Запись из другого процесса видна без копирования."""
+        self.cache.get('key')
+        child = Process(
+            target=set_in_child, args=(self.location, 'key', 'из потомка')
+        )
+        child.start()
+        child.join()
+        self.assertEqual(self.cache.get('key'), 'из потомка')
+
+    def test_clock_eviction(self):
+        """Прочитанный ключ получает второй шанс при вытеснении."""
+        cache = shared_cache(f'{self.directory}/small', SLOTS=WAYS)
+        for key in range(WAYS + 1):
+            cache.set(key, key)
+        self.assertIsNone(cache.get(0))
+        cache.get(2)
+        cache.set('new', 'new')
+        cache.set('newer', 'newer')
+        self.assertEqual(cache.get(2), 2)
+        self.assertIsNone(cache.get(1))
+        self.assertIsNone(cache.get(3))
+
+    def test_value_larger_than_slot(self):
+        """Значение больше слота не кэшируется и не оставляет старое."""
+        cache = shared_cache(f'{self.directory}/tiny', SLOT_SIZE=256)
+        cache.set('key', 'короткое')
+        cache.set('key', 'x' * 1024)
+        self.assertIsNone(cache.get('key'))
+        self.assertFalse(cache.add('other', 'x' * 1024))
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command(
+            'cache_benchmark', keys=20, operations=50, processes=[2],
+            stdout=out,
+        )
+        for backend in ('locmem', 'filebased', 'shared'):
+            self.assertIn(backend, out.getvalue())
+
+
+class QueryReportTests(TestCase):
+    def test_normalize_groups_same_queries(self):
+        self.assertEqual(
+            normalize('SELECT * FROM t WHERE id IN (%s, %s) LIMIT 21'),
+            normalize("SELECT * FROM t WHERE id IN (%s) LIMIT 'x'"),
+        )
+
+    def test_repeated_queries_detected(self):
+        with record_queries() as log:
+            for pk in range(3):
+                User.objects.filter(pk=pk).first()
+        self.assertEqual(len(log), 3)
+        self.assertEqual(len(log.repeated()), 1)
+        self.assertIn('3 × SELECT', log.report())
+
+    @override_settings(DEBUG=True)
+    def test_middleware_reports_in_debug(self):
+        response = Client().get('/')
+        self.assertIn('X-Query-Count', response)
+        self.assertIn('X-Query-Time', response)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings = override_settings(
+            METRICS_DIR=self.directory, METRICS_FLUSH_INTERVAL=0
+        )
+        self.settings.enable()
+        metrics.registry().views.clear()
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_server_timing_header(self):
+        """Ответ сообщает время базы, кэша и шаблонов."""
+        timing = Client().get('/about/tech/')['Server-Timing']
+        for part in ('db;dur=', 'cache;desc=', 'tpl;dur=', 'total;dur='):
+            self.assertIn(part, timing)
+
+    def test_metrics_sum_all_workers(self):
+        """/metrics складывает файлы всех процессов."""
+        client = Client()
+        client.force_login(User.objects.create_user('staff', is_staff=True))
+        client.get('/')
+        client.get('/')
+        other = metrics.Registry()
+        other.pid = 0
+        other.observe('posts:index', metrics.RequestMetrics())
+        other.flush()
+        response = client.get('/metrics')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        text = response.content.decode()
+        self.assertIn(
+            'yatube_view_duration_seconds_count{view="posts:index"} 3', text
+        )
+        self.assertRegex(
+            text, r'yatube_cache_hits_total\{view="posts:index"\} [1-9]'
+        )
+        self.assertRegex(
+            text, r'yatube_db_queries_total\{view="posts:index"\} [1-9]'
+        )
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_closed_to_outside(self):
+        """Без токена и прав сотрудника /metrics закрыт даже с
+        127.0.0.1, куда приходят запросы через прокси."""
+        for headers in ({}, {'HTTP_AUTHORIZATION': 'Bearer wrong'}):
+            response = Client(REMOTE_ADDR='127.0.0.1').get(
+                '/metrics', **headers
+            )
+            self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+        response = Client().get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings = override_settings(PROFILE_DIR=self.directory)
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    @override_settings(
+        PROFILE_SAMPLE_RATE=1, PROFILE_KEEP=2, PROFILE_PRUNE_EVERY=1
+    )
+    def test_sampled_requests_rotated(self):
+        """В каталоге остаются только PROFILE_KEEP свежих профилей."""
+        for _ in range(3):
+            response = Client().get('/')
+        self.assertTrue(response['X-Profile'].startswith('posts.index__'))
+        self.assertEqual(len(profiling.profiles()), 2)
+
+    @override_settings(PROFILE_KEEP=1)
+    def test_prune_by_name_ignores_vanished_files(self):
+        """Свежесть берётся из имени файла, а не из stat: файл, удалённый
+        другим процессом между glob и сортировкой, не роняет запрос."""
+        names = [
+            'posts.index__5ms__20260101-000000-000000__1.prof',
+            'posts.index__5ms__20260102-000000-000000__1.prof',
+        ]
+        for number, name in enumerate(names):
+            path = os.path.join(self.directory, name)
+            open(path, 'w').close()
+            # mtime против порядка имён.
+            os.utime(path, (1000 - number, 1000 - number))
+        with mock.patch('os.path.getmtime', side_effect=FileNotFoundError):
+            self.assertEqual(
+                [os.path.basename(path) for path in profiling.profiles()],
+                names,
+            )
+            profiling.prune()
+        self.assertEqual(os.listdir(self.directory), [names[-1]])
+
+    def test_signed_header(self):
+        """Без выборки профилируются только запросы с верной подписью."""
+        Client().get('/', HTTP_X_PROFILE='подделка')
+        self.assertEqual(profiling.profiles(), [])
+        response = Client().get(
+            '/about/tech/', HTTP_X_PROFILE=profiling.make_token()
+        )
+        self.assertIn('X-Profile', response)
+        self.assertEqual(len(profiling.profiles()), 1)
+
+    @override_settings(PROFILE_SAMPLE_RATE=1)
+    def test_summary_command(self):
+        Client().get('/')
+        Client().get('/about/tech/')
+        out = StringIO()
+        call_command('profile_summary', '--view', 'posts:index', stdout=out)
+        self.assertIn('== posts.index: профилей 1', out.getvalue())
+        self.assertIn('function calls', out.getvalue())
+        self.assertNotIn('about.tech', out.getvalue())
+
+
+@override_settings(SLOW_QUERY_THRESHOLD=0)
+class SlowQueryTests(TestCase):
+    def test_slow_query_logged_with_plan(self):
+        """В журнал попадают план, вьюха и место вызова в проекте."""
+        cache.clear()
+        with self.assertLogs('yatube.slow_queries') as logs:
+            Client().get('/')
+        entries = [json.loads(record.getMessage()) for record in logs.records]
+        posts = [
+            entry for entry in entries
+            if 'FROM "posts_post"' in entry['sql']
+            and entry['view'] == 'posts:index'
+        ]
+        self.assertTrue(posts)
+        self.assertTrue(posts[0]['plan'])
+        self.assertTrue(any(
+            line.startswith('posts/') for line in posts[0]['stack']
+        ))
+
+    def test_command_aggregates_statements(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        path = f'{directory}/slow.jsonl'
+        entry = {
+            'statement': 'SELECT ? FROM posts_post', 'duration': 0.2,
+            'view': 'posts:index', 'plan': ['SCAN posts_post'], 'stack': [],
+        }
+        with open(f'{path}.1', 'w') as stream:
+            stream.write(json.dumps(entry) + '\n')
+        with open(path, 'w') as stream:
+            stream.write(json.dumps({**entry, 'duration': 0.4}) + '\n')
+            stream.write(json.dumps({
+                **entry, 'statement': 'SELECT ? FROM posts_comment',
+            }) + '\n')
+        out = StringIO()
+        call_command('slow_queries', '--file', path, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertIn('2 раз, всего 600 мс', lines[0])
+        self.assertEqual(lines[1].strip(), 'SELECT ? FROM posts_post')
+        self.assertIn('план: SCAN posts_post', lines[2])
@@ -1,4 +1,10 @@
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from core import metrics as collected_metrics
 
 
 def page_not_found(request, exception):
@@ -20,3 +26,23 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics(request):
+    """Метрики всех воркеров узла для Prometheus.
+
+    Доступны сотрудникам и по токену METRICS_TOKEN в заголовке
+    ``Authorization: Bearer <токен>``. Адрес клиента не проверяется:
+    за обратным прокси на том же узле все запросы приходят с 127.0.0.1.
+    """
+    token = settings.METRICS_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if not request.user.is_staff and not (
+        token and constant_time_compare(header, f'Bearer {token}')
+    ):
+        raise PermissionDenied
+    collected_metrics.registry().flush()
+    return HttpResponse(
+        collected_metrics.render(collected_metrics.load()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
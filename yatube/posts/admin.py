@@ -1,10 +1,14 @@
 from django.contrib import admin
 
+from core.admin import (
+    AutocompleteFilter, AutocompleteFilterMixin, ScalableAdminMixin
+)
 from .models import Comment, Follow, Group, Post
+from .search import search_posts
 
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'text',
@@ -13,10 +17,19 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
+    preview_fields = ('text',)
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Вместо LIKE '%слово%' по всей таблице — индекс FTS5.
+        if not search_term:
+            return queryset, False
+        return search_posts(queryset, search_term), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -32,14 +45,29 @@ class GroupAdmin(admin.ModelAdmin):
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(
+    AutocompleteFilterMixin, ScalableAdminMixin, admin.ModelAdmin
+):
     list_display = ('post', 'author', 'text', 'created')
+    list_select_related = ('post', 'author')
+    autocomplete_fields = ('post', 'author')
+    preview_fields = ('text',)
     search_fields = ('text', 'created')
-    list_filter = ('post', 'author', 'text')
+    list_filter = (
+        ('post', AutocompleteFilter),
+        ('author', AutocompleteFilter),
+    )
 
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(
+    AutocompleteFilterMixin, ScalableAdminMixin, admin.ModelAdmin
+):
     list_display = ('user', 'author')
-    search_fields = ('user', 'author')
-    list_filter = ('user', 'author')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
+    list_filter = (
+        ('user', AutocompleteFilter),
+        ('author', AutocompleteFilter),
+    )
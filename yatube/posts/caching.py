@@ -0,0 +1,190 @@
+import hashlib
+import math
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+VERSION_KEY = 'feed-version:{}'
+PAGE_KEY = 'feed-page:{view}:{user}:{path}'
+COUNT_KEY = 'feed-count:{scopes}:{versions}'
+# Каждая лента показывает названия групп в карточках постов.
+GROUPS_SCOPE = 'groups'
+CARD_TEMPLATES = (
+    'posts/includes/post_card.html',
+    'posts/includes/follow_card.html',
+)
+
+
+def _initial_version():
+    # Версия, созданная заново после вытеснения ключа, не совпадёт
+    # ни с одной из прежних, поэтому старые страницы не оживут.
+    return int(time.time() * 1000)
+
+
+def get_versions(scopes):
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump(*scopes):
+    """Инвалидирует все закэшированные страницы перечисленных областей."""
+    for scope in scopes:
+        key = VERSION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), None)
+
+
+def _count_key(scopes):
+    return COUNT_KEY.format(
+        scopes='|'.join(scopes),
+        versions='|'.join(map(str, get_versions(scopes))),
+    )
+
+
+def cached_count(scopes, compute):
+    """Число постов ленты, пересчитываемое после смены версий scopes."""
+    key = _count_key(scopes)
+    count = cache.get(key)
+    if count is None:
+        count = compute()
+        cache.set(key, count, settings.FEED_CACHE_TIMEOUT)
+    return count
+
+
+def store_count(scopes, count):
+    """Заменяет закэшированное число постов ленты уточнённым."""
+    cache.set(_count_key(scopes), count, settings.FEED_CACHE_TIMEOUT)
+
+
+def follow_scopes(user):
+    """Области ленты подписок: любой пост (его создание и удаление
+    увеличивают версию index) и подписки самого пользователя."""
+    return ['index', f'follow:{user.pk}']
+
+
+def post_scopes(post, group_slug=None):
+    scopes = ['index', f'author:{post.author.username}']
+    if group_slug:
+        scopes.append(f'group:{group_slug}')
+    return scopes
+
+
+def page_key(request, view_name):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return PAGE_KEY.format(
+        view=view_name,
+        user=request.user.pk or 0,
+        path=path,
+    )
+
+
+def needs_refresh(entry, now=None):
+    """Вероятностное досрочное обновление (XFetch).
+
+    Чем ближе мягкий срок жизни и чем дольше страница строилась в прошлый
+    раз, тем выше шанс, что очередной запрос перестроит её заранее. Так
+    перестроения популярных страниц размазываются во времени, а не
+    случаются одновременно в момент истечения.
+    """
+    now = time.time() if now is None else now
+    gap = -entry['delta'] * settings.FEED_CACHE_BETA * math.log(
+        1.0 - random.random()
+    )
+    return now + gap >= entry['expires']
+
+
+def _from_entry(entry):
+    return HttpResponse(entry['content'], content_type=entry['content_type'])
+
+
+def _render(view, request, args, kwargs, key, versions):
+    started = time.monotonic()
+    response = view(request, *args, **kwargs)
+    if response.status_code == 200 and not response.streaming:
+        cache.set(
+            key,
+            {
+                'versions': versions,
+                'content': response.content,
+                'content_type': response['Content-Type'],
+                'expires': time.time() + settings.FEED_CACHE_TIMEOUT,
+                'delta': time.monotonic() - started,
+            },
+            settings.FEED_CACHE_TIMEOUT + settings.FEED_CACHE_STALE_TIMEOUT,
+        )
+    return response
+
+
+def cache_feed(*scopes):
+    """Кэширует страницу ленты до изменения её данных.
+
+    Области (``'index'``, ``'group:{slug}'``, ``'author:{username}'``)
+    подставляются из аргументов вьюхи. Вместе со страницей хранятся
+    версии её областей; сигналы моделей увеличивают версии при изменениях,
+    поэтому страница живёт FEED_CACHE_TIMEOUT и устаревает ровно тогда,
+    когда меняется что-то на ней показанное.
+
+    Перестраивает устаревшую страницу только тот запрос, что взял
+    короткую блокировку в кэше; остальные в это время получают прежнюю
+    копию, а без копии строят страницу сами, не сохраняя её.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            key = page_key(request, view.__name__)
+            versions = get_versions(
+                [GROUPS_SCOPE] + [scope.format(**kwargs) for scope in scopes]
+            )
+            entry = cache.get(key)
+            if (
+                entry is not None
+                and entry['versions'] == versions
+                and not needs_refresh(entry)
+            ):
+                return _from_entry(entry)
+            lock = f'{key}:lock'
+            if cache.add(lock, True, settings.FEED_CACHE_LOCK_TIMEOUT):
+                try:
+                    return _render(view, request, args, kwargs, key, versions)
+                finally:
+                    cache.delete(lock)
+            if entry is not None:
+                return _from_entry(entry)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def card_key(post, template_name):
+    """Ключ HTML карточки: id поста и хэш всего, что на ней показано."""
+    author = post.author
+    group = post.group
+    content = '|'.join(map(str, (
+        template_name,
+        post.text,
+        post.pub_date.isoformat(),
+        post.image.name,
+        author.username,
+        author.get_full_name(),
+        group.slug if group else '',
+        group.title if group else '',
+    )))
+    version = hashlib.md5(content.encode()).hexdigest()
+    return f'post-card:{post.pk}:{version}'
+
+
+def forget_cards(post):
+    cache.delete_many([card_key(post, name) for name in CARD_TEMPLATES])
@@ -0,0 +1,235 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import (
+    BooleanField, Count, Exists, F, IntegerField, OuterRef, Subquery, Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce
+
+from .caching import bump, get_versions
+from .hydration import AUTHOR_FIELDS
+from .models import (
+    AuthorStats, Comment, Follow, Group, GroupStats, Post, PostStats, User
+)
+
+AUTHOR_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+POST_COUNTERS = {
+    'comments_count': (Comment, 'post'),
+}
+GROUP_COUNTERS = {
+    'posts_count': (Post, 'group'),
+}
+PROFILE_COUNTERS = ('posts_count', 'followers_count')
+# Страницы, которые показывают счётчики: владелец строки, его поле
+# в имени области и сама область. Число комментариев есть только на
+# странице поста, которая не кэшируется.
+STATS_SCOPES = {
+    AuthorStats: (User, 'username', 'author:{}'),
+    GroupStats: (Group, 'slug', 'group:{}'),
+}
+PROFILE_KEY = 'profile-author:{username}:{viewer}:{version}'
+
+
+def _subquery_count(model, field):
+    rows = model.objects.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def annotate_counts(queryset, counters):
+    """Добавляет к выборке точные значения счётчиков подзапросами."""
+    return queryset.annotate(**{
+        name: _subquery_count(model, field)
+        for name, (model, field) in counters.items()
+    })
+
+
+def recount_author(user_id):
+    counts = annotate_counts(
+        User.objects.filter(pk=user_id), AUTHOR_COUNTERS
+    ).values(*AUTHOR_COUNTERS).get()
+    stats, _ = AuthorStats.objects.update_or_create(
+        user_id=user_id, defaults=counts
+    )
+    return stats
+
+
+def recount_post(post_id):
+    counts = annotate_counts(
+        Post.objects.filter(pk=post_id), POST_COUNTERS
+    ).values(*POST_COUNTERS).get()
+    stats, _ = PostStats.objects.update_or_create(
+        post_id=post_id, defaults=counts
+    )
+    return stats
+
+
+def recount_group(group_id):
+    counts = annotate_counts(
+        Group.objects.filter(pk=group_id), GROUP_COUNTERS
+    ).values(*GROUP_COUNTERS).get()
+    stats, _ = GroupStats.objects.update_or_create(
+        group_id=group_id, defaults=counts
+    )
+    return stats
+
+
+def _bump_repaired(model, pks):
+    if model not in STATS_SCOPES or not pks:
+        return
+    owner, field, scope = STATS_SCOPES[model]
+    bump(*(
+        scope.format(value) for value in owner.objects.filter(
+            pk__in=pks
+        ).values_list(field, flat=True)
+    ))
+
+
+def repair_stats(queryset, model, counters, batch_size):
+    """Сверяет счётчики строк выборки с точными и чинит расхождения.
+
+    Выборка обходится по pk пачками по batch_size: на пачку один запрос
+    с подзапросами подсчёта, один in_bulk хранимых строк и по одному
+    bulk_create и bulk_update. Версии страниц с исправленными
+    счётчиками меняются. Возвращает (проверено, исправлено).
+    """
+    queryset = annotate_counts(queryset, counters).order_by('pk').values(
+        'pk', *counters
+    )
+    checked = repaired = 0
+    last_pk = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not rows:
+            return checked, repaired
+        last_pk = rows[-1]['pk']
+        stored = model.objects.in_bulk([row['pk'] for row in rows])
+        missing, drifted = [], []
+        for row in rows:
+            pk = row.pop('pk')
+            stats = stored.get(pk)
+            if stats is None:
+                missing.append(model(pk=pk, **row))
+            elif any(getattr(stats, f) != v for f, v in row.items()):
+                for field, value in row.items():
+                    setattr(stats, field, value)
+                drifted.append(stats)
+        with transaction.atomic():
+            model.objects.bulk_create(missing, ignore_conflicts=True)
+            model.objects.bulk_update(drifted, list(counters))
+        _bump_repaired(model, [stats.pk for stats in missing + drifted])
+        checked += len(rows)
+        repaired += len(missing) + len(drifted)
+
+
+def author_stats(user_id):
+    try:
+        return AuthorStats.objects.get(pk=user_id)
+    except AuthorStats.DoesNotExist:
+        return recount_author(user_id)
+
+
+def post_stats(post_id):
+    try:
+        return PostStats.objects.get(pk=post_id)
+    except PostStats.DoesNotExist:
+        return recount_post(post_id)
+
+
+def _change(model, pk, field, delta, recount):
+    """Атомарно сдвигает счётчик через F(), не опускаясь ниже нуля.
+
+    Строки счётчиков создаются лениво: если её ещё нет, при увеличении
+    значения пересчитываются целиком, а уменьшение просто пропускается,
+    так как удаляемый объект мог уже унести с собой и саму строку.
+    """
+    rows = model.objects.filter(pk=pk)
+    if delta < 0:
+        rows = rows.filter(**{f'{field}__gte': -delta})
+    if not rows.update(**{field: F(field) + delta}) and delta > 0:
+        recount(pk)
+
+
+def change_author(user_id, field, delta):
+    _change(AuthorStats, user_id, field, delta, recount_author)
+
+
+def change_post(post_id, field, delta):
+    _change(PostStats, post_id, field, delta, recount_post)
+
+
+def change_group(group_id, delta):
+    if group_id is not None:
+        _change(GroupStats, group_id, 'posts_count', delta, recount_group)
+
+
+def _stored_posts(stats):
+    rows = stats.order_by().annotate(
+        one=Value(1, IntegerField())
+    ).values('one').annotate(total=Sum('posts_count')).values('total')
+    return Subquery(rows, output_field=IntegerField())
+
+
+def site_posts_total():
+    """Число всех постов по AuthorStats подзапросом для estimate_count."""
+    return _stored_posts(AuthorStats.objects.all())
+
+
+def group_posts_total(group_id):
+    """Число постов группы по GroupStats подзапросом."""
+    return _stored_posts(GroupStats.objects.filter(pk=group_id))
+
+
+def followed_posts_total(user):
+    """Число постов авторов, на которых подписан user, подзапросом."""
+    return _stored_posts(AuthorStats.objects.filter(
+        user__following__user=user
+    ))
+
+
+def profile_author(username, viewer):
+    """Автор для шапки профиля одним запросом, None — если его нет.
+
+    К пользователю добавлены posts_count и followers_count из
+    AuthorStats и is_following — подписан ли на него viewer (через
+    Exists). Из пользователя читаются только поля AUTHOR_FIELDS, пароль
+    в кэш не попадает. Результат кэшируется для пары автор/зритель до
+    смены версии области author:{username}, которую сигналы меняют при
+    новых постах и подписках.
+    """
+    scope = f'author:{username}'
+    key = PROFILE_KEY.format(
+        username=username,
+        viewer=viewer.pk or 0,
+        version=get_versions([scope])[0],
+    )
+    author = cache.get(key)
+    if author is not None:
+        return author
+    if viewer.is_authenticated:
+        is_following = Exists(Follow.objects.filter(
+            user=viewer, author=OuterRef('pk')
+        ))
+    else:
+        is_following = Value(False, output_field=BooleanField())
+    author = User.objects.filter(username=username).only(
+        *AUTHOR_FIELDS
+    ).annotate(
+        **{name: F(f'stats__{name}') for name in PROFILE_COUNTERS},
+        is_following=is_following,
+    ).first()
+    if author is None:
+        return None
+    if author.posts_count is None:
+        # Строки счётчиков создаются лениво.
+        stats = recount_author(author.pk)
+        for name in PROFILE_COUNTERS:
+            setattr(author, name, getattr(stats, name))
+    cache.set(key, author, settings.FEED_CACHE_TIMEOUT)
+    return author
@@ -0,0 +1,122 @@
+import csv
+import json
+from itertools import chain
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from .models import Comment, Follow
+
+# Тот же формат записей, что читает import_posts.
+FIELDS = (
+    'type', 'id', 'text', 'author', 'group', 'pub_date', 'image',
+    'post', 'created', 'user',
+)
+CONTENT_TYPES = {
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def _rows(kind, queryset, fields):
+    """Записи из values_list(): поля базы переименованы в имена FIELDS,
+    в памяти держится одна пачка запроса."""
+    names = tuple(fields.values())
+    rows = queryset.values_list(*fields).iterator(
+        chunk_size=settings.EXPORT_CHUNK_SIZE
+    )
+    for row in rows:
+        yield {'type': kind, **dict(zip(names, row))}
+
+
+def post_rows(queryset):
+    return _rows('post', queryset.order_by('-pub_date', '-pk'), {
+        'id': 'id',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'image': 'image',
+        'author__username': 'author',
+        'group__slug': 'group',
+    })
+
+
+def comment_rows(queryset, ordering=('post', 'created')):
+    # 'post' — порядок постов (-pub_date): в выгрузке группы комментарии
+    # идут за постами по индексу post_group_date_idx.
+    return _rows('comment', queryset.order_by(*ordering), {
+        'id': 'id',
+        'text': 'text',
+        'created': 'created',
+        'post_id': 'post',
+        'author__username': 'author',
+    })
+
+
+def follow_rows(queryset):
+    return _rows('follow', queryset.order_by('pk'), {
+        'user__username': 'user',
+        'author__username': 'author',
+    })
+
+
+def author_archive(author):
+    """Всё, что написал пользователь, и его подписки."""
+    return chain(
+        post_rows(author.posts.all()),
+        # По индексу comment_author_post_idx, без сортировки.
+        comment_rows(
+            Comment.objects.filter(author=author), ('post_id', 'created')
+        ),
+        follow_rows(Follow.objects.filter(user=author)),
+    )
+
+
+def group_archive(group):
+    return chain(
+        post_rows(group.posts.all()),
+        comment_rows(Comment.objects.filter(post__group=group)),
+    )
+
+
+def _isoformat(value):
+    # DjangoJSONEncoder обрезает микросекунды, а даты должны пережить
+    # выгрузку и обратную загрузку без изменений.
+    return value.isoformat()
+
+
+def jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False, default=_isoformat)
+        yield '\n'
+
+
+class Echo:
+    """Файл для csv.writer, который возвращает строку, а не пишет её."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.DictWriter(Echo(), FIELDS)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def lines(rows, fmt):
+    return csv_lines(rows) if fmt == 'csv' else jsonl_lines(rows)
+
+
+def export_response(rows, fmt, name):
+    """Отдаёт записи потоком: первая строка уходит сразу после первой
+    пачки запроса, а в памяти не бывает больше одной пачки."""
+    if fmt not in CONTENT_TYPES:
+        fmt = 'jsonl'
+    response = StreamingHttpResponse(
+        lines(rows, fmt), content_type=CONTENT_TYPES[fmt]
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{name}.{fmt}"'
+    )
+    return response
@@ -1,8 +1,23 @@
 from django.forms import ModelForm
+from django.forms.models import ModelChoiceIterator
 
+from posts.groups import all_groups
 from posts.models import Comment, Post
 
 
+class GroupChoiceIterator(ModelChoiceIterator):
+    """Варианты выбора группы из справочника, без запроса к базе."""
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for group in all_groups():
+            yield self.choice(group)
+
+    def __len__(self):
+        return len(all_groups()) + (self.field.empty_label is not None)
+
+
 class PostForm(ModelForm):
     class Meta:
         model = Post
@@ -18,6 +33,14 @@ class PostForm(ModelForm):
             "image": "Добавь, если хочешь!",
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Поле остаётся ModelChoiceField и проверяет выбор по базе,
+        # а список для отрисовки берёт из справочника групп.
+        group = self.fields['group']
+        group.iterator = GroupChoiceIterator
+        group.widget.choices = group.choices
+
 
 class CommentForm(ModelForm):
     class Meta:
@@ -0,0 +1,74 @@
+"""Справочник групп в памяти процесса.
+
+Групп немного, меняются они редко, а нужны почти каждой странице:
+заголовок ленты группы, карточки постов, выпадающий список формы.
+Справочник перечитывается целиком одним запросом, когда истёк
+GROUP_REGISTRY_TTL или сменилась версия области GROUPS_SCOPE в общем
+кэше. Её увеличивают сигналы сохранения и удаления Group, поэтому
+изменение, сделанное в одном воркере, остальные увидят при следующем
+обращении.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from .caching import GROUPS_SCOPE, get_versions
+from .models import Group, Post
+
+
+class GroupRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.loaded = 0.0
+        self.groups = ()
+        self.by_pk = {}
+        self.by_slug = {}
+
+    def refresh(self):
+        """Перечитывает справочник, если он устарел; возвращает себя."""
+        version = get_versions([GROUPS_SCOPE])[0]
+        with self.lock:
+            if (
+                version != self.version
+                or time.monotonic() - self.loaded
+                > settings.GROUP_REGISTRY_TTL
+            ):
+                groups = tuple(Group.objects.order_by('pk'))
+                self.by_pk = {group.pk: group for group in groups}
+                self.by_slug = {group.slug: group for group in groups}
+                self.groups = groups
+                self.version = version
+                self.loaded = time.monotonic()
+        return self
+
+
+registry = GroupRegistry()
+
+
+def all_groups():
+    return registry.refresh().groups
+
+
+def get_group(slug):
+    """Группа по slug или None; неизвестный slug проверяется в базе,
+    на случай если версия справочника ещё не дошла до этого воркера."""
+    group = registry.refresh().by_slug.get(slug)
+    if group is None:
+        group = Group.objects.filter(slug=slug).first()
+    return group
+
+
+def attach(posts):
+    """Подставляет постам группы из справочника вместо запросов.
+
+    Группы, которой нет в справочнике, считаются удалёнными: пост
+    показывается без группы, а не читает её из базы.
+    """
+    by_pk = registry.refresh().by_pk
+    for post in posts:
+        if post.group_id and not Post.group.is_cached(post):
+            Post.group.field.set_cached_value(
+                post, by_pk.get(post.group_id)
+            )
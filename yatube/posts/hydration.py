@@ -0,0 +1,63 @@
+"""Посты лент по списку id: объекты из кэша, промахи — одним запросом.
+
+Ленты выбирают из базы только упорядоченные id страницы, это проход по
+индексу без чтения строк. Сами посты и их авторы достаются из общего
+кэша одним get_many на модель, недостающие читаются одним in_bulk и
+кладутся в кэш. Группы подставляет справочник групп. Сигналы удаляют
+записи при сохранении и удалении постов и пользователей.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .groups import attach
+from .models import Post, User
+
+POST_KEY = 'post:{}'
+AUTHOR_KEY = 'author:{}'
+# Авторы кэшируются без пароля и прочих служебных полей.
+AUTHOR_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def _objects(queryset, key, ids):
+    """Объекты по id: сначала из кэша, промахи — одним in_bulk."""
+    cached = cache.get_many([key.format(pk) for pk in ids])
+    found = {obj.pk: obj for obj in cached.values()}
+    missing = [pk for pk in ids if pk not in found]
+    if missing:
+        loaded = queryset.in_bulk(missing)
+        cache.set_many(
+            {key.format(pk): obj for pk, obj in loaded.items()},
+            settings.OBJECT_CACHE_TIMEOUT,
+        )
+        found.update(loaded)
+    return found
+
+
+def hydrate(ids):
+    """Посты с авторами и группами в порядке ids; пропавшие пропускаются."""
+    ids = list(ids)
+    if not ids:
+        return []
+    found = _objects(Post.objects.all(), POST_KEY, ids)
+    posts = [found[pk] for pk in ids if pk in found]
+    authors = _objects(
+        User.objects.only(*AUTHOR_FIELDS),
+        AUTHOR_KEY,
+        list({post.author_id for post in posts}),
+    )
+    for post in posts:
+        post.author = authors[post.author_id]
+    attach(posts)
+    return posts
+
+
+def forget_post(pk):
+    cache.delete(POST_KEY.format(pk))
+
+
+def forget_posts(ids):
+    cache.delete_many([POST_KEY.format(pk) for pk in ids])
+
+
+def forget_author(pk):
+    cache.delete(AUTHOR_KEY.format(pk))
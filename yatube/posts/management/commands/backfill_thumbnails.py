@@ -0,0 +1,133 @@
+import os
+import time
+from multiprocessing import Pool
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import thumbnails
+from posts.models import Post
+
+
+def render(item):
+    pk, image_name = item
+    try:
+        return pk, thumbnails.render_thumbnails(image_name), None
+    except Exception as error:
+        return pk, None, str(error)
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит миниатюры для всех картинок постов пулом процессов '
+        'и печатает пропускную способность.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=None,
+            help='Число процессов пула, по умолчанию по числу ядер.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Сколько постов обрабатывать и записывать за раз.',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Обработать не больше стольких картинок (для замеров).',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(
+                settings.BASE_DIR, '.backfill_thumbnails.checkpoint'
+            ),
+            help='Файл с id последнего обработанного поста.',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать с начала, не читая контрольную точку.',
+        )
+
+    def read_checkpoint(self, path):
+        try:
+            with open(path) as checkpoint:
+                return int(checkpoint.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def write_checkpoint(self, path, pk):
+        with open(path, 'w') as checkpoint:
+            checkpoint.write(str(pk))
+
+    def batches(self, posts, start_after, size, limit):
+        """Посты пачками по возрастанию id, без OFFSET."""
+        last_pk, left = start_after, limit
+        while left is None or left > 0:
+            take = size if left is None else min(size, left)
+            batch = list(posts.filter(pk__gt=last_pk)[:take])
+            if not batch:
+                return
+            yield batch
+            last_pk = batch[-1].pk
+            if left is not None:
+                left -= len(batch)
+
+    def handle(self, *args, **options):
+        start_after = 0
+        if not options['restart']:
+            start_after = self.read_checkpoint(options['checkpoint'])
+        posts = Post.objects.exclude(image='').select_related(
+            'author', 'group'
+        ).order_by('pk')
+        total = posts.filter(pk__gt=start_after).count()
+        if options['limit'] is not None:
+            total = min(total, options['limit'])
+        self.stdout.write(
+            f'Картинок к обработке: {total}, начиная после id {start_after}'
+        )
+        # Дочерние процессы не ходят в базу, а унаследованные при fork
+        # соединения им только мешают.
+        connections.close_all()
+        started = time.monotonic()
+        done = failed = 0
+        with Pool(options['processes'], initializer=django.setup) as pool:
+            for batch in self.batches(
+                posts, start_after, options['batch_size'], options['limit']
+            ):
+                results = []
+                items = [(post.pk, post.image.name) for post in batch]
+                for pk, result, error in pool.imap_unordered(render, items):
+                    if error is None:
+                        results.append(result)
+                    else:
+                        failed += 1
+                        self.stderr.write(f'Пост {pk}: {error}')
+                thumbnails.store_thumbnails(results)
+                thumbnails.thumbnails_ready(batch)
+                self.write_checkpoint(options['checkpoint'], batch[-1].pk)
+                done += len(batch)
+                self.report(done, total, failed, started)
+        elapsed = time.monotonic() - started
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {done} картинок за {elapsed:.1f} с, '
+            f'{rate:.1f} изобр./с, ошибок: {failed}'
+        ))
+
+    def report(self, done, total, failed, started):
+        elapsed = time.monotonic() - started
+        rate = done / elapsed if elapsed else 0
+        percent = done * 100 / total if total else 100
+        self.stdout.write(
+            f'{done}/{total} ({percent:.1f}%), {rate:.1f} изобр./с, '
+            f'ошибок: {failed}'
+        )
@@ -0,0 +1,63 @@
+import time
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+from posts.models import Group, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты группы или архив автора в JSONL или CSV '
+        'в формате, который читает import_posts.'
+    )
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--group', help='Слаг группы.')
+        source.add_argument('--author', help='Имя пользователя.')
+        parser.add_argument(
+            '--format', choices=tuple(export.CONTENT_TYPES), default='jsonl'
+        )
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='Файл для записи, «-» — стандартный вывод.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            if options['group']:
+                rows = export.group_archive(
+                    Group.objects.get(slug=options['group'])
+                )
+            else:
+                rows = export.author_archive(
+                    User.objects.get(username=options['author'])
+                )
+        except (Group.DoesNotExist, User.DoesNotExist) as error:
+            raise CommandError(error)
+        started = time.monotonic()
+        self.count = 0
+        with self.open(options['output']) as stream:
+            for line in export.lines(self.counted(rows), options['format']):
+                stream.write(line)
+        self.stderr.write(
+            f'Выгружено {self.count} строк за '
+            f'{time.monotonic() - started:.1f} с'
+        )
+
+    @contextmanager
+    def open(self, path):
+        if path == '-':
+            self.stdout.ending = ''
+            yield self.stdout
+            return
+        with open(path, 'w', encoding='utf-8', newline='') as stream:
+            yield stream
+
+    def counted(self, rows):
+        for row in rows:
+            self.count += 1
+            yield row
@@ -0,0 +1,136 @@
+import time
+from datetime import timedelta
+from statistics import median
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from posts import recent
+from posts.management.commands.import_posts import original_dates
+from posts.models import Follow, Post, User
+
+PREFIX = 'follow-benchmark-'
+
+
+class Rollback(Exception):
+    """Откатывает тестовые данные после замеров."""
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает первую страницу ленты подписок: SQL-соединение '
+        'author__following__user против слияния списков последних '
+        'постов авторов. Данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--authors', type=int, nargs='+', default=[10, 100, 5000],
+            help='На сколько авторов подписан читатель.',
+        )
+        parser.add_argument(
+            '--posts', type=int, default=20,
+            help='Сколько постов у каждого автора.',
+        )
+        parser.add_argument(
+            '--other-posts', type=int, default=50000,
+            help=(
+                'Сколько постов у авторов без подписки: через них '
+                'SQL-соединение пробирается по индексу дат.'
+            ),
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        for authors in options['authors']:
+            try:
+                with transaction.atomic():
+                    self.run(authors, options)
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def run(self, authors, options):
+        viewer = User.objects.create(username=f'{PREFIX}viewer')
+        other = User.objects.create(username=f'{PREFIX}other')
+        User.objects.bulk_create(
+            User(username=f'{PREFIX}{number}') for number in range(authors)
+        )
+        # bulk_create в SQLite не возвращает id.
+        author_ids = list(User.objects.filter(
+            username__startswith=PREFIX
+        ).exclude(
+            pk__in=(viewer.pk, other.pk)
+        ).values_list('pk', flat=True))
+        Follow.objects.bulk_create(
+            Follow(user=viewer, author_id=pk) for pk in author_ids
+        )
+        start = timezone.now() - timedelta(days=365)
+        # Посты подписок — в первой половине года, чужие — позже.
+        with original_dates(Post._meta.get_field('pub_date')):
+            Post.objects.bulk_create((
+                Post(
+                    author_id=pk,
+                    text='Пост для замера',
+                    pub_date=start + timedelta(minutes=number * authors + i),
+                )
+                for number in range(options['posts'])
+                for i, pk in enumerate(author_ids)
+            ))
+            Post.objects.bulk_create(
+                Post(
+                    author=other,
+                    text='Чужой пост',
+                    pub_date=start + timedelta(days=180, minutes=number),
+                )
+                for number in range(options['other_posts'])
+            )
+        keys = [recent.RECENT_KEY.format(pk) for pk in author_ids]
+        try:
+            self.report(authors, viewer, keys, options['repeat'])
+        finally:
+            # id откатятся и достанутся другим авторам.
+            cache.delete_many(keys)
+
+    def report(self, authors, viewer, keys, repeat):
+        limit = settings.NUMBER_OBJECTS
+
+        def join():
+            return list(Post.objects.filter(
+                author__following__user=viewer
+            ).order_by('-pub_date', '-pk').values_list(
+                'pk', flat=True
+            )[:limit])
+
+        def merge():
+            followed = Follow.objects.filter(user=viewer).values_list(
+                'author_id', flat=True
+            )
+            return recent.merged_ids(followed, limit)
+
+        def cold():
+            cache.delete_many(keys)
+            return merge()
+
+        expected = join()
+        results = {}
+        for name, run in (
+            ('SQL-соединение', join),
+            ('слияние, холодный кэш', cold),
+            ('слияние, тёплый кэш', merge),
+        ):
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                ids = run()
+                timings.append(time.perf_counter() - started)
+            results[name] = median(timings)
+            if ids != expected:
+                self.stderr.write(f'{name}: страница не совпала с SQL')
+        for name, seconds in results.items():
+            self.stdout.write(
+                f'авторов {authors:>6}  {name:<22} {seconds * 1000:>8.2f} мс'
+            )
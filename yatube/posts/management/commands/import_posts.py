@@ -0,0 +1,253 @@
+import csv
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import caching, counters, recent, timeline
+from posts.models import Comment, Follow, Group, Post, PostStats, User
+
+RECORD_TYPES = ('post', 'comment', 'follow')
+
+
+@contextmanager
+def original_dates(*fields):
+    """Отключает auto_now_add, чтобы сохранить даты из источника."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def read_jsonl(stream, default_type):
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                raise CommandError(f'Строка {number}: {error}')
+            yield record.pop('type', default_type), record
+
+
+def read_csv(stream, default_type):
+    for record in csv.DictReader(stream):
+        yield record.pop('type', None) or default_type, record
+
+
+def parse_id(value):
+    return int(value) if value else None
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise ValueError(f'неверная дата {value!r}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты, комментарии и подписки из JSONL или CSV '
+        'пачками через bulk_create.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Файл с данными, «-» — стандартный ввод.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=('jsonl', 'csv'),
+            help='Формат входа, по умолчанию по расширению файла.',
+        )
+        parser.add_argument(
+            '--type',
+            choices=RECORD_TYPES,
+            default='post',
+            help='Тип записей без поля type (для CSV — всего файла).',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк вставлять одной транзакцией.',
+        )
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or (
+            'csv' if options['path'].endswith('.csv') else 'jsonl'
+        )
+        reader = read_csv if fmt == 'csv' else read_jsonl
+        self.batch_size = options['batch_size']
+        # Словари поиска растут с числом пользователей и групп,
+        # а не со входом: строки не копятся в памяти дольше пачки.
+        self.users = dict(User.objects.values_list('username', 'pk'))
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.buffers = {name: [] for name in RECORD_TYPES}
+        # Кого и что задела загрузка: по ним finish пересчитывает
+        # счётчики и сбрасывает кэш.
+        self.authors = set()
+        self.followers = set()
+        self.group_slugs = set()
+        # Крайние id прокомментированных постов, а не их множество.
+        self.commented = None
+        self.imported = self.skipped = 0
+        self.started = time.monotonic()
+        with self.open(options['path']) as stream:
+            with original_dates(
+                Post._meta.get_field('pub_date'),
+                Comment._meta.get_field('created'),
+            ):
+                for line, (kind, record) in enumerate(
+                    reader(stream, options['type']), 1
+                ):
+                    self.add(line, kind, record)
+                self.flush()
+        self.finish()
+
+    @contextmanager
+    def open(self, path):
+        if path == '-':
+            yield sys.stdin
+            return
+        try:
+            stream = open(path, encoding='utf-8', newline='')
+        except OSError as error:
+            raise CommandError(error)
+        with stream:
+            yield stream
+
+    def add(self, line, kind, record):
+        build = getattr(self, f'build_{kind}', None)
+        try:
+            if build is None:
+                raise ValueError(f'неизвестный тип записи {kind!r}')
+            obj = build(record)
+        except (KeyError, ValueError) as error:
+            self.skipped += 1
+            self.stderr.write(f'Строка {line}: {error}')
+            return
+        self.buffers[kind].append(obj)
+        if len(self.buffers[kind]) >= self.batch_size:
+            self.flush()
+
+    def user(self, record, field):
+        username = record[field]
+        if username not in self.users:
+            raise ValueError(f'нет пользователя {username!r}')
+        return self.users[username]
+
+    def build_post(self, record):
+        group = record.get('group') or None
+        if group is not None and group not in self.groups:
+            raise ValueError(f'нет группы {group!r}')
+        post = Post(
+            id=parse_id(record.get('id')),
+            text=record['text'],
+            author_id=self.user(record, 'author'),
+            group_id=self.groups.get(group),
+            image=record.get('image') or '',
+            pub_date=parse_date(record.get('pub_date')),
+        )
+        self.authors.add(post.author_id)
+        if group is not None:
+            self.group_slugs.add(group)
+        return post
+
+    def build_comment(self, record):
+        return Comment(
+            id=parse_id(record.get('id')),
+            post_id=int(record['post']),
+            author_id=self.user(record, 'author'),
+            text=record['text'],
+            created=parse_date(record.get('created')),
+        )
+
+    def build_follow(self, record):
+        follow = Follow(
+            user_id=self.user(record, 'user'),
+            author_id=self.user(record, 'author'),
+        )
+        if follow.user_id == follow.author_id:
+            raise ValueError('подписка на самого себя')
+        self.authors.add(follow.author_id)
+        self.followers.add(follow.user_id)
+        return follow
+
+    def flush(self):
+        # Посты раньше комментариев: те ссылаются на них по id.
+        posts, comments, follows = (
+            self.buffers[name] for name in RECORD_TYPES
+        )
+        if comments:
+            known = set(Post.objects.filter(
+                pk__in={comment.post_id for comment in comments}
+            ).values_list('pk', flat=True))
+            known.update(post.pk for post in posts)
+            missing = [c for c in comments if c.post_id not in known]
+            for comment in missing:
+                self.stderr.write(f'Нет поста {comment.post_id}')
+            self.skipped += len(missing)
+            comments[:] = [c for c in comments if c.post_id in known]
+            if comments:
+                ids = [c.post_id for c in comments]
+                low, high = self.commented or (min(ids), max(ids))
+                self.commented = (min(low, *ids), max(high, *ids))
+        with transaction.atomic():
+            # ignore_conflicts: повторный запуск с теми же id и уже
+            # существующие подписки (unique_following) не роняют загрузку.
+            for model, rows in (
+                (Post, posts), (Comment, comments), (Follow, follows)
+            ):
+                model.objects.bulk_create(
+                    rows, self.batch_size, ignore_conflicts=True
+                )
+                self.imported += len(rows)
+        for rows in self.buffers.values():
+            rows.clear()
+        self.report('Загружено')
+
+    def report(self, label):
+        elapsed = time.monotonic() - self.started
+        rate = self.imported / elapsed if elapsed else 0
+        self.stdout.write(
+            f'{label}: {self.imported} строк, пропущено {self.skipped}, '
+            f'{rate:.0f} строк/с'
+        )
+
+    def finish(self):
+        """bulk_create не вызывает сигналы: догоняем ленты, счётчики
+        и кэш страниц после загрузки, только для задетых строк."""
+        for author_id in self.authors:
+            # refresh пересчитывает и счётчики автора.
+            timeline.refresh(author_id)
+            recent.forget(author_id)
+        for user_id in self.followers - self.authors:
+            counters.recount_author(user_id)
+        for slug in self.group_slugs:
+            counters.recount_group(self.groups[slug])
+        if self.commented is not None:
+            counters.repair_stats(
+                Post.objects.filter(pk__range=self.commented),
+                PostStats, counters.POST_COUNTERS, self.batch_size,
+            )
+        scopes = {'index'}
+        scopes.update(f'group:{slug}' for slug in self.group_slugs)
+        scopes.update(f'follow:{user_id}' for user_id in self.followers)
+        usernames = {pk: name for name, pk in self.users.items()}
+        scopes.update(f'author:{usernames[pk]}' for pk in self.authors)
+        caching.bump(*scopes)
+        self.report('Готово')
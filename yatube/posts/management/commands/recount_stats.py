@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import (
+    AUTHOR_COUNTERS, GROUP_COUNTERS, POST_COUNTERS, repair_stats
+)
+from posts.models import (
+    AuthorStats, Group, GroupStats, Post, PostStats, User
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики авторов, групп и постов и чинит '
+        'расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк пересчитывать за один запрос.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for queryset, model, counters in (
+            (User.objects.all(), AuthorStats, AUTHOR_COUNTERS),
+            (Group.objects.all(), GroupStats, GROUP_COUNTERS),
+            (Post.objects.all(), PostStats, POST_COUNTERS),
+        ):
+            checked, repaired = repair_stats(
+                queryset, model, counters, batch_size
+            )
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: проверено {checked}, '
+                f'исправлено {repaired}'
+            )
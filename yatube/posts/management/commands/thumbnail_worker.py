@@ -0,0 +1,89 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import F
+
+from posts import thumbnails
+from posts.models import ThumbnailTask
+
+MAX_ATTEMPTS = 3
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры картинок из очереди новых и изменённых постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=None,
+            help='Число процессов пула, по умолчанию по числу ядер.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20,
+            help='Сколько задач забирать из очереди за раз.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='Пауза в секундах, когда очередь пуста.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Разобрать очередь и выйти.',
+        )
+
+    def handle(self, *args, **options):
+        # Дочерним процессам не нужно наследовать открытые соединения.
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=options['processes'], initializer=django.setup
+        ) as pool:
+            while True:
+                if self.process_batch(pool, options['batch_size']):
+                    continue
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+
+    def process_batch(self, pool, batch_size):
+        tasks = list(ThumbnailTask.objects.filter(
+            attempts__lt=MAX_ATTEMPTS
+        ).select_related('post__author', 'post__group')[:batch_size])
+        if not tasks:
+            return 0
+        futures = [
+            (task, pool.submit(
+                thumbnails.render_thumbnails, task.post.image.name
+            ))
+            for task in tasks if task.post.image
+        ]
+        results, ready, failed = [], [], []
+        for task, future in futures:
+            try:
+                results.append(future.result())
+            except Exception as error:
+                self.stderr.write(f'Пост {task.post_id}: {error}')
+                failed.append(task.pk)
+            else:
+                ready.append(task)
+        thumbnails.store_thumbnails(results)
+        for task in tasks:
+            if task.pk not in failed:
+                # Задачу могли перепоставить, пока строились миниатюры.
+                ThumbnailTask.objects.filter(
+                    pk=task.pk, queued=task.queued
+                ).delete()
+        ThumbnailTask.objects.filter(pk__in=failed).update(
+            attempts=F('attempts') + 1
+        )
+        thumbnails.thumbnails_ready(task.post for task in ready)
+        self.stdout.write(f'Готово миниатюр: {len(ready)}')
+        return len(tasks)
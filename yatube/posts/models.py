@@ -50,27 +50,55 @@ class Post(models.Model):
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_date_idx',
+            ),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
 
 class Comment(models.Model):
+    # Отдельные индексы внешних ключей не нужны: их покрывают составные
+    # индексы ниже, по которым ещё и идёт сортировка выгрузки.
     post = models.ForeignKey(
         Post,
         related_name='comments',
         on_delete=models.SET_NULL,
         null=True,
+        db_index=False,
     )
     author = models.ForeignKey(
         User,
         related_name='comments',
         on_delete=models.CASCADE,
         null=True,
+        db_index=False,
     )
     text = models.TextField(verbose_name='Текст комментария')
     created = models.DateTimeField(auto_now_add=True)
 
     class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx',
+            ),
+            models.Index(
+                fields=['author', 'post', 'created'],
+                name='comment_author_post_idx',
+            ),
+        ]
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
@@ -90,6 +118,12 @@ class Follow(models.Model):
     )
 
     class Meta:
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx',
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'author'], name='unique_following'
@@ -97,3 +131,126 @@ class Follow(models.Model):
         ]
         verbose_name = 'Подписчик'
         verbose_name_plural = 'Подписчики'
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date', '-post_id')
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_date_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry'
+            )
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+
+
+class HotAuthor(models.Model):
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='hot_author',
+        verbose_name='Автор',
+    )
+    since = models.DateTimeField(verbose_name='Без рассылки с')
+
+    class Meta:
+        verbose_name = 'Популярный автор'
+        verbose_name_plural = 'Популярные авторы'
+
+
+class AuthorStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0, verbose_name='Постов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, verbose_name='Подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0, verbose_name='Подписок'
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики автора'
+        verbose_name_plural = 'Счётчики авторов'
+
+
+class GroupStats(models.Model):
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Группа',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0, verbose_name='Постов'
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики группы'
+        verbose_name_plural = 'Счётчики групп'
+
+
+class PostStats(models.Model):
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пост',
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0, verbose_name='Комментариев'
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики поста'
+        verbose_name_plural = 'Счётчики постов'
+
+
+class ThumbnailTask(models.Model):
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='thumbnail_task',
+        verbose_name='Пост',
+    )
+    queued = models.DateTimeField(
+        auto_now=True, verbose_name='Поставлена в очередь'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0, verbose_name='Попыток'
+    )
+
+    class Meta:
+        ordering = ('queued',)
+        verbose_name = 'Задача на миниатюры'
+        verbose_name_plural = 'Задачи на миниатюры'
@@ -0,0 +1,136 @@
+"""Последние посты авторов в кэше и лента подписок слиянием их списков.
+
+Для каждого автора в кэше лежит упорядоченный от новых к старым список
+пар (pub_date, id) длиной не больше recent_limit(); создание и удаление
+поста сбрасывают список автора. Первые
+FOLLOW_MERGE_PAGES страниц ленты подписок получаются k-путевым
+слиянием (heapq.merge) таких списков всех авторов, на которых подписан
+пользователь: каждый автор даёт в них не больше recent_limit() постов,
+поэтому слияние точное. Дальние страницы, курсоры и ленты тех, кто
+подписан больше чем на FOLLOW_MERGE_MAX_AUTHORS авторов, читает Timeline:
+тысячи списков из кэша обходятся дороже одного прохода по его таблице.
+"""
+from heapq import merge
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .hydration import hydrate
+from .models import Follow, Post
+from .timeline import Timeline
+
+RECENT_KEY = 'recent-posts:{}'
+# Запрос в списке IN не длиннее этого, SQLite ограничивает параметры.
+CHUNK_SIZE = 500
+
+
+def recent_limit():
+    return settings.FOLLOW_MERGE_PAGES * settings.NUMBER_OBJECTS
+
+
+def _load(author_ids):
+    """Последние посты авторов по индексу (author, -pub_date, -id)."""
+    table = Post._meta.db_table
+    lists = {author_id: [] for author_id in author_ids}
+    for start in range(0, len(author_ids), CHUNK_SIZE):
+        chunk = author_ids[start:start + CHUNK_SIZE]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT author_id, pub_date, id FROM ('
+                f'SELECT author_id, pub_date, id, ROW_NUMBER() OVER ('
+                f'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+                f') AS position FROM {table} '
+                f'WHERE author_id IN ({", ".join(["%s"] * len(chunk))})'
+                f') WHERE position <= %s',
+                [*chunk, recent_limit()],
+            )
+            rows = cursor.fetchall()
+        convert = connection.ops.convert_datetimefield_value
+        field = Post._meta.get_field('pub_date')
+        for author_id, pub_date, pk in rows:
+            pub_date = convert(pub_date, field, connection)
+            lists[author_id].append((pub_date, pk))
+    for posts in lists.values():
+        posts.sort(reverse=True)
+    return lists
+
+
+def recent_posts(author_ids):
+    """Списки последних постов авторов: из кэша, промахи — из базы."""
+    author_ids = list(author_ids)
+    cached = cache.get_many([RECENT_KEY.format(pk) for pk in author_ids])
+    lists = {
+        pk: cached[RECENT_KEY.format(pk)] for pk in author_ids
+        if RECENT_KEY.format(pk) in cached
+    }
+    missing = [pk for pk in author_ids if pk not in lists]
+    if missing:
+        loaded = _load(missing)
+        cache.set_many(
+            {RECENT_KEY.format(pk): posts for pk, posts in loaded.items()},
+            settings.RECENT_POSTS_TIMEOUT,
+        )
+        lists.update(loaded)
+    return lists
+
+
+def forget(author_id):
+    """Сбрасывает список автора; следующий читатель прочтёт его заново.
+
+    Список не дописывается на месте: читатель, начавший загрузку до
+    нового поста, затёр бы дописанный список своим старым.
+    """
+    cache.delete(RECENT_KEY.format(author_id))
+
+
+def merged_ids(author_ids, limit):
+    """Первые limit id постов авторов, слияние списков от новых к старым."""
+    lists = recent_posts(author_ids).values()
+    return [pk for _, pk in islice(merge(*lists, reverse=True), limit)]
+
+
+class FollowFeed:
+    """Лента подписок: первые страницы слиянием списков авторов.
+
+    Срезы в пределах recent_limit() собираются merged_ids из кэша,
+    остальное — счётчик, дальние страницы, курсоры и слишком длинные
+    списки подписок — берёт Timeline, который создаётся, только когда
+    понадобится.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._timeline = None
+
+    @property
+    def timeline(self):
+        if self._timeline is None:
+            self._timeline = Timeline(self.user)
+        return self._timeline
+
+    def count(self):
+        return self.timeline.count()
+
+    def __len__(self):
+        return self.count()
+
+    def estimate_count(self, limit):
+        return self.timeline.estimate_count(limit)
+
+    def keyset(self, cursor=None, backwards=False, limit=None):
+        return self.timeline.keyset(cursor, backwards, limit)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if index.stop > recent_limit():
+            return self.timeline[index]
+        limit = settings.FOLLOW_MERGE_MAX_AUTHORS
+        author_ids = list(Follow.objects.filter(user=self.user).values_list(
+            'author_id', flat=True
+        )[:limit + 1])
+        if len(author_ids) > limit:
+            return self.timeline[index]
+        return hydrate(merged_ids(author_ids, index.stop)[index])
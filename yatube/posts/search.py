@@ -0,0 +1,71 @@
+import re
+
+from django.db import connection
+
+FTS_TABLE = 'posts_post_fts'
+WORD = re.compile(r'\w+')
+MATCHES = (
+    f'posts_post.id IN '
+    f'(SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)'
+)
+COUNT = f'SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+# Столбец rank у FTS5 — это bm25(); сортировку по нему FTS5 делает
+# за один проход по найденным документам.
+RANKED = (
+    f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+    f'ORDER BY rank, rowid DESC LIMIT %s OFFSET %s'
+)
+
+
+def match_expression(query):
+    """Запрос FTS5 из строки пользователя: все слова, каждое как префикс.
+
+    Слова берутся в кавычки, поэтому операторы FTS5 во вводе
+    не интерпретируются и не приводят к ошибке синтаксиса.
+    """
+    return ' '.join(f'"{word}"*' for word in WORD.findall(query.lower()))
+
+
+def search_posts(queryset, query):
+    """Посты, найденные по индексу FTS5, без сортировки по релевантности."""
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    return queryset.extra(where=[MATCHES], params=[expression])
+
+
+class SearchResults:
+    """Результаты поиска от самых релевантных (bm25), для Paginator.
+
+    Число найденных и id страницы читаются прямо из FTS5, а посты
+    страницы — одним запросом по id из queryset.
+    """
+
+    def __init__(self, queryset, query):
+        self.queryset = queryset
+        self.expression = match_expression(query)
+
+    def _fetch(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def count(self):
+        if not self.expression:
+            return 0
+        return self._fetch(COUNT, [self.expression])[0][0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if not self.expression:
+            return []
+        start = index.start or 0
+        ids = [pk for pk, in self._fetch(
+            RANKED, [self.expression, index.stop - start, start]
+        )]
+        posts = self.queryset.in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
@@ -0,0 +1,152 @@
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from . import caching, counters, hydration, recent, timeline
+from .models import Comment, Follow, Group, Post, User
+
+
+def _group_slug(post):
+    return post.group.slug if post.group_id else None
+
+
+@receiver(pre_save, sender=Post)
+def post_remember_group(sender, instance, **kwargs):
+    if instance.pk:
+        instance._previous_group_id, instance._previous_group_slug = (
+            Post.objects.filter(pk=instance.pk).values_list(
+                'group_id', 'group__slug'
+            ).first() or (None, None)
+        )
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    caching.bump(
+        *caching.post_scopes(instance, _group_slug(instance)),
+        *caching.post_scopes(
+            instance, getattr(instance, '_previous_group_slug', None)
+        ),
+    )
+    hydration.forget_post(instance.pk)
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if created or previous_group_id != instance.group_id:
+        counters.change_group(instance.group_id, 1)
+        if not created:
+            counters.change_group(previous_group_id, -1)
+    if created:
+        counters.change_author(instance.author_id, 'posts_count', 1)
+        timeline.fan_out(instance)
+        recent.forget(instance.author_id)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    caching.bump(*caching.post_scopes(instance, _group_slug(instance)))
+    hydration.forget_post(instance.pk)
+    counters.change_author(instance.author_id, 'posts_count', -1)
+    counters.change_group(instance.group_id, -1)
+    recent.forget(instance.author_id)
+
+
+@receiver(pre_save, sender=User)
+def user_remember_names(sender, instance, update_fields=None, **kwargs):
+    names = None
+    # Вход в систему сохраняет только last_login, имя не читаем.
+    if instance.pk and (
+        update_fields is None
+        or set(update_fields) & set(hydration.AUTHOR_FIELDS)
+    ):
+        names = User.objects.filter(pk=instance.pk).values(
+            *hydration.AUTHOR_FIELDS
+        ).first()
+    instance._previous_names = names
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, **kwargs):
+    hydration.forget_author(instance.pk)
+    previous = getattr(instance, '_previous_names', None)
+    names = {f: getattr(instance, f) for f in hydration.AUTHOR_FIELDS}
+    if previous is None or previous == names:
+        return
+    # Имя автора показано в карточках его постов на главной, в его
+    # профиле и в группах, где он писал.
+    slugs = Post.objects.filter(author=instance).exclude(
+        group=None
+    ).values_list('group__slug', flat=True).distinct()
+    username = previous['username']
+    caching.bump(
+        'index',
+        f'author:{username}',
+        f'author:{instance.username}',
+        *(f'group:{slug}' for slug in slugs),
+    )
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    # Посты автора удалены каскадом, их сигналы уже сменили версии.
+    hydration.forget_author(instance.pk)
+
+
+@receiver(pre_delete, sender=Group)
+def group_remember_posts(sender, instance, **kwargs):
+    # SET_NULL обнуляет group_id одним UPDATE без сигналов, поэтому id
+    # постов группы запоминаются до удаления.
+    instance._post_ids = list(
+        Post.objects.filter(group=instance).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    caching.bump(caching.GROUPS_SCOPE, f'group:{instance.slug}')
+    hydration.forget_posts(getattr(instance, '_post_ids', ()))
+
+
+def _bump_commented_post(post_id):
+    # Пост комментария мог быть удалён в том же каскаде.
+    post = Post.objects.select_related('author', 'group').filter(
+        pk=post_id
+    ).first()
+    if post is not None:
+        caching.bump(*caching.post_scopes(post, _group_slug(post)))
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if instance.post_id:
+        _bump_commented_post(instance.post_id)
+    if created and instance.post_id:
+        counters.change_post(instance.post_id, 'comments_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    if instance.post_id:
+        _bump_commented_post(instance.post_id)
+        counters.change_post(instance.post_id, 'comments_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    caching.bump(
+        f'author:{instance.author.username}', f'follow:{instance.user_id}'
+    )
+    if created:
+        counters.change_author(instance.author_id, 'followers_count', 1)
+        counters.change_author(instance.user_id, 'following_count', 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    caching.bump(
+        f'author:{instance.author.username}', f'follow:{instance.user_id}'
+    )
+    counters.change_author(instance.author_id, 'followers_count', -1)
+    counters.change_author(instance.user_id, 'following_count', -1)
+    timeline.trim(instance.user_id, instance.author_id)
@@ -0,0 +1,43 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+
+from posts.caching import card_key
+from posts.groups import attach
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def cached_cards(context, posts,
+                 template_name='posts/includes/post_card.html'):
+    """HTML карточек страницы ленты.
+
+    Все карточки читаются из кэша одним get_many, рендерятся только
+    промахи. Карточка зависит лишь от поста, поэтому рендерится в
+    собственном контексте и годится для любого зрителя. Группы постов
+    берутся из справочника групп. Карточка с полноразмерной картинкой
+    вместо ещё не готовой миниатюры живёт POST_CARD_PENDING_TIMEOUT.
+    """
+    posts = list(posts)
+    attach(posts)
+    keys = [card_key(post, template_name) for post in posts]
+    cached = cache.get_many(keys)
+    card_template = context.template.engine.get_template(template_name)
+    cards, missed, pending_cards = [], {}, {}
+    for post, key in zip(posts, keys):
+        html = cached.get(key)
+        if html is None:
+            pending = set()
+            html = card_template.render(template.Context(
+                {'post': post, 'pending_thumbnails': pending},
+                autoescape=context.autoescape,
+            ))
+            (pending_cards if pending else missed)[key] = html
+        cards.append(mark_safe(html))
+    if missed:
+        cache.set_many(missed, settings.POST_CARD_CACHE_TIMEOUT)
+    if pending_cards:
+        cache.set_many(pending_cards, settings.POST_CARD_PENDING_TIMEOUT)
+    return cards
@@ -0,0 +1,21 @@
+from django import template
+
+from posts.utils import encode_cursor, page_window
+
+register = template.Library()
+
+
+@register.filter
+def cursor_after(page):
+    return encode_cursor(page[len(page) - 1])
+
+
+@register.filter
+def cursor_before(page):
+    return encode_cursor(page[0])
+
+
+@register.filter
+def page_numbers(page):
+    """Окно номеров страниц для паджинатора, None — пропуск «…»."""
+    return page_window(page.number, page.paginator.num_pages)
@@ -0,0 +1,20 @@
+from django import template
+
+from posts.thumbnails import ready_thumbnail as get_ready_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def ready_thumbnail(context, file_, geometry, **options):
+    """Миниатюра, если воркер уже её построил, иначе пустое значение.
+
+    Картинка без миниатюры добавляется в набор pending_thumbnails из
+    контекста, если он есть: по нему cached_cards узнаёт карточки с
+    заглушкой.
+    """
+    thumbnail = get_ready_thumbnail(file_, geometry, **options)
+    pending = context.get('pending_thumbnails')
+    if file_ and thumbnail is None and pending is not None:
+        pending.add(file_.name)
+    return thumbnail
@@ -0,0 +1,122 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.admin import estimate_rows
+from ..models import Comment, Follow, Group, Post, User
+
+
+class ScalableAdminTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        cls.groups = Group.objects.bulk_create(
+            Group(title=f'Группа {number}', slug=f'group-{number}')
+            for number in range(5)
+        )
+        cls.post = Post.objects.create(
+            author=cls.admin, text='Очень длинный текст поста ' * 20
+        )
+        Comment.objects.create(
+            post=cls.post, author=cls.admin, text='Комментарий ' * 20
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_changelists_skip_exact_count(self):
+        """Списки постов и комментариев не делают COUNT(*) по таблице."""
+        for model in ('post', 'comment'):
+            with self.subTest(model=model):
+                url = reverse(f'admin:posts_{model}_changelist')
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['cl'].result_count, 1)
+                for query in queries.captured_queries:
+                    self.assertNotIn('COUNT(*)', query['sql'])
+
+    def test_post_changelist_is_lean(self):
+        """Текст обрезается в базе, группы не выводятся списком."""
+        response = self.client.get(reverse('admin:posts_post_changelist'))
+        self.assertNotContains(response, self.post.text)
+        self.assertContains(response, self.post.text[:80])
+        self.assertNotContains(response, self.groups[-1].title)
+
+    def test_filtered_count(self):
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'текст'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_estimate_uses_table_statistics(self):
+        Post.objects.create(author=self.admin, text='Ещё пост')
+        self.assertEqual(estimate_rows(Post), 2)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE posts_post')
+        self.assertEqual(estimate_rows(Post), 2)
+
+
+class AutocompleteFilterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        User.objects.bulk_create(
+            User(username=f'reader-{number}') for number in range(30)
+        )
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.get(username='reader-0')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.admin, author=cls.author)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_filters_do_not_list_options(self):
+        """Боковая панель не перечисляет пользователей и комментарии."""
+        for model in ('follow', 'comment'):
+            with self.subTest(model=model):
+                response = self.client.get(
+                    reverse(f'admin:posts_{model}_changelist')
+                )
+                self.assertContains(response, 'autocomplete-filter')
+                self.assertContains(
+                    response, reverse('admin:auth_user_autocomplete')
+                )
+                self.assertNotContains(response, 'reader-29')
+
+    def test_filter_applies_selected_value(self):
+        response = self.client.get(
+            reverse('admin:posts_follow_changelist'),
+            {'user__id__exact': self.reader.pk},
+        )
+        self.assertEqual(
+            [follow.user for follow in response.context['cl'].result_list],
+            [self.reader],
+        )
+        self.assertContains(
+            response,
+            f'<option value="{self.reader.pk}" selected>reader-0</option>',
+            html=True,
+        )
+
+    def test_autocomplete_is_limited(self):
+        response = self.client.get(
+            reverse('admin:auth_user_autocomplete'), {'term': 'reader'}
+        )
+        data = response.json()
+        self.assertEqual(len(data['results']), 20)
+        self.assertTrue(data['pagination']['more'])
+
+    def test_follow_search_by_username(self):
+        response = self.client.get(
+            reverse('admin:posts_follow_changelist'), {'q': 'reader-0'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 1)
@@ -1,17 +1,34 @@
 import shutil
 import tempfile
+from io import StringIO
 
 from http import HTTPStatus
 
 from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
-from ..models import Comment, Group, Post, User
+from core.queries import record_queries
+from ..caching import card_key
+from ..groups import all_groups
+from ..models import Comment, Group, Post, ThumbnailTask, User
 from ..forms import PostForm
+from ..thumbnails import POST_THUMBNAILS, ready_thumbnail
+
+GEOMETRY, OPTIONS = POST_THUMBNAILS[0]
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -92,6 +109,55 @@ class PostFormTests(TestCase):
         self.assertEqual(post.author, self.author)
         self.assertEqual(post.group.id, form_data['group'])
         self.assertEqual(post.image, 'posts/small.gif')
+        self.assertTrue(ThumbnailTask.objects.filter(post=post).exists())
+        self.assertIsNone(ready_thumbnail(post.image, GEOMETRY, **OPTIONS))
+        call_command('thumbnail_worker', once=True, stdout=StringIO())
+        self.assertFalse(ThumbnailTask.objects.exists())
+        thumbnail = ready_thumbnail(post.image, GEOMETRY, **OPTIONS)
+        self.assertEqual(thumbnail.size, [960, 339])
+        response = self.author_client.get(self.REVERSE_ADDRESS_PROFILE)
+        self.assertContains(response, thumbnail.url)
+
+    @override_settings(POST_CARD_PENDING_TIMEOUT=0)
+    def test_pending_thumbnail_card_short_lived(self):
+        """Карточка с заглушкой вместо миниатюры кэшируется ненадолго."""
+        cache.clear()
+        post = Post.objects.create(
+            author=self.author,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('pending.gif', SMALL_GIF),
+        )
+        self.author_client.get(self.REVERSE_ADDRESS_PROFILE)
+        template_name = 'posts/includes/post_card.html'
+        self.assertIsNone(cache.get(card_key(post, template_name)))
+        self.assertIsNotNone(cache.get(card_key(self.post, template_name)))
+
+    def test_backfill_thumbnails_resumes(self):
+        """Пакетная генерация миниатюр продолжает с контрольной точки."""
+        posts = [
+            Post.objects.create(
+                author=self.author,
+                text='Пост с картинкой',
+                image=SimpleUploadedFile(f'backfill-{index}.gif', SMALL_GIF),
+            )
+            for index in range(2)
+        ]
+        options = {
+            'processes': 1,
+            'checkpoint': f'{TEMP_MEDIA_ROOT}/backfill.checkpoint',
+            'stdout': StringIO(),
+        }
+        call_command('backfill_thumbnails', limit=1, **options)
+        first, second = (
+            ready_thumbnail(post.image, GEOMETRY, **OPTIONS)
+            for post in posts
+        )
+        self.assertEqual(first.size, [960, 339])
+        self.assertIsNone(second)
+        call_command('backfill_thumbnails', **options)
+        second = ready_thumbnail(posts[1].image, GEOMETRY, **OPTIONS)
+        self.assertEqual(second.size, [960, 339])
+        self.assertIn('изобр./с', options['stdout'].getvalue())
 
     def test_post_edit(self):
         """Проверяем, что происходит изменение поста."""
@@ -129,6 +195,22 @@ class PostFormTests(TestCase):
             len(response.context.get('page_obj')), 0
         )
 
+    def test_groups_from_registry(self):
+        """Форма и лента группы берут группы из справочника процесса."""
+        cache.clear()
+        all_groups()
+        with record_queries() as log:
+            self.author_client.get(self.REVERSE_ADDRESS_CREATE)
+            self.author_client.get(
+                reverse('posts:group_list', args=(self.group.slug,))
+            )
+        self.assertFalse(
+            [sql for sql, _ in log.queries if 'FROM "posts_group"' in sql]
+        )
+        Group.objects.create(title='Новая группа', slug='new')
+        response = self.author_client.get(self.REVERSE_ADDRESS_CREATE)
+        self.assertContains(response, 'Новая группа')
+
     def test_client_do_not_create_post(self):
         """Проверяем, что аноним не может создать пост."""
         post_count = Post.objects.count()
@@ -1,6 +1,19 @@
+import json
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-from ..models import Group, Post, User
+from .. import caching
+from ..models import (
+    AuthorStats, Comment, Follow, Group, Post, PostStats, TimelineEntry, User
+)
 
 
 class PostModelTest(TestCase):
@@ -42,3 +55,181 @@ class PostModelTest(TestCase):
                     self.post._meta.get_field(field).verbose_name,
                     expected_value,
                 )
+
+
+class StatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый пост',
+        )
+
+    def test_counters_follow_changes(self):
+        """Счётчики меняются вместе с постами, подписками и комментариями."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        comment = Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        author = AuthorStats.objects.get(pk=self.author.pk)
+        self.assertEqual(author.posts_count, 1)
+        self.assertEqual(author.followers_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(pk=self.reader.pk).following_count, 1
+        )
+        self.assertEqual(
+            PostStats.objects.get(pk=self.post.pk).comments_count, 1
+        )
+        comment.delete()
+        Follow.objects.all().delete()
+        self.assertEqual(
+            PostStats.objects.get(pk=self.post.pk).comments_count, 0
+        )
+        self.assertEqual(
+            AuthorStats.objects.get(pk=self.author.pk).followers_count, 0
+        )
+
+    def test_recount_stats_repairs_drift(self):
+        """Команда recount_stats исправляет разъехавшиеся счётчики."""
+        AuthorStats.objects.filter(pk=self.author.pk).update(posts_count=7)
+        AuthorStats.objects.filter(pk=self.reader.pk).delete()
+        scopes = [f'author:{self.author.username}', 'index']
+        before = caching.get_versions(scopes)
+        call_command('recount_stats', batch_size=1, stdout=StringIO())
+        # Профиль с исправленным счётчиком перестраивается.
+        after = caching.get_versions(scopes)
+        self.assertNotEqual(after[0], before[0])
+        self.assertEqual(after[1], before[1])
+        self.assertEqual(
+            AuthorStats.objects.get(pk=self.author.pk).posts_count, 1
+        )
+        self.assertTrue(AuthorStats.objects.filter(pk=self.reader.pk).exists())
+
+
+class ImportPostsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write(self, name, content):
+        path = f'{self.directory}/{name}'
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def test_import_jsonl(self):
+        """Загрузка сохраняет даты и догоняет ленты и счётчики."""
+        records = [
+            {'type': 'post', 'id': 100, 'text': 'Старый пост',
+             'author': 'author', 'group': 'group',
+             'pub_date': '2015-03-01T10:00:00+00:00'},
+            {'type': 'comment', 'post': 100, 'author': 'reader',
+             'text': 'Старый комментарий',
+             'created': '2015-03-02T10:00:00+00:00'},
+            {'type': 'comment', 'post': 999, 'author': 'reader',
+             'text': 'К несуществующему посту'},
+            {'type': 'post', 'text': 'Пост', 'author': 'nobody'},
+            {'type': 'follow', 'user': 'reader', 'author': 'author'},
+            {'type': 'follow', 'user': 'author', 'author': 'reader'},
+        ]
+        path = self.write('data.jsonl', '\n'.join(map(json.dumps, records)))
+        out, err = StringIO(), StringIO()
+        call_command(
+            'import_posts', path, batch_size=2, stdout=out, stderr=err
+        )
+        post = Post.objects.get(pk=100)
+        self.assertEqual(post.pub_date.year, 2015)
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.comments.get().created.day, 2)
+        self.assertEqual(Follow.objects.count(), 2)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(
+            AuthorStats.objects.get(pk=self.author.pk).posts_count, 1
+        )
+        self.assertEqual(PostStats.objects.get(pk=100).comments_count, 1)
+        self.assertIn('пропущено 2', out.getvalue())
+        self.assertIn('строк/с', out.getvalue())
+        self.assertIn("нет пользователя 'nobody'", err.getvalue())
+        self.assertTrue(Post._meta.get_field('pub_date').auto_now_add)
+
+    def test_import_recounts_comments_in_batches(self):
+        """Счётчики комментариев пересчитываются пачками: число запросов
+        не растёт с числом прокомментированных постов."""
+        def import_comments(first, number):
+            records = [
+                {'type': 'post', 'id': pk, 'text': 'Пост',
+                 'author': 'author'}
+                for pk in range(first, first + number)
+            ] + [
+                {'type': 'comment', 'post': pk, 'author': 'reader',
+                 'text': 'Комментарий'}
+                for pk in range(first, first + number)
+            ]
+            path = self.write(
+                f'{first}.jsonl', '\n'.join(map(json.dumps, records))
+            )
+            with CaptureQueriesContext(connection) as queries:
+                call_command('import_posts', path, stdout=StringIO())
+            return len(queries)
+
+        self.assertEqual(import_comments(1000, 3), import_comments(2000, 30))
+        self.assertEqual(
+            PostStats.objects.filter(
+                pk__gte=2000, comments_count=1
+            ).count(),
+            30,
+        )
+
+    def test_import_csv(self):
+        path = self.write(
+            'posts.csv',
+            'text,author,group\nПервый,author,group\nВторой,author,\n',
+        )
+        call_command('import_posts', path, stdout=StringIO())
+        self.assertEqual(
+            list(Post.objects.order_by('text').values_list('text', 'group')),
+            [('Второй', None), ('Первый', self.group.pk)],
+        )
+
+    def test_import_refreshes_touched_cache_only(self):
+        """После загрузки шапка профиля и счётчик ленты группы свежие,
+        а счётчики незадетых пользователей не пересчитываются."""
+        cache.clear()
+        stranger = User.objects.create_user(username='stranger')
+        AuthorStats.objects.update_or_create(
+            user=stranger, defaults={'posts_count': 5}
+        )
+        profile = reverse('posts:profile', args=(self.author.username,))
+        group = reverse('posts:group_list', args=(self.group.slug,))
+        self.assertEqual(
+            self.client.get(profile).context['author'].posts_count, 0
+        )
+        self.assertEqual(
+            self.client.get(group).context['page_obj'].paginator.count, 0
+        )
+        path = self.write(
+            'posts.csv', 'text,author,group\nПервый,author,group\n'
+        )
+        call_command('import_posts', path, stdout=StringIO())
+        self.assertEqual(
+            self.client.get(profile).context['author'].posts_count, 1
+        )
+        self.assertEqual(
+            self.client.get(group).context['page_obj'].paginator.count, 1
+        )
+        self.assertEqual(AuthorStats.objects.get(user=stranger).posts_count, 5)
@@ -0,0 +1,111 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.queries import record_queries
+from core.testing import QueryBudgetMixin
+from ..groups import all_groups, attach
+from ..hydration import hydrate
+from ..models import Comment, Follow, Group, Post, User
+from ..recent import recent_posts
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Число запросов страниц не зависит от числа постов и комментариев."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.authors = [
+            User.objects.create_user(username=f'author-{number}')
+            for number in range(5)
+        ]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.user, author=author)
+            for number in range(3):
+                Post.objects.create(
+                    author=author, group=cls.group, text=f'Пост {number}'
+                )
+        cls.post = Post.objects.latest('pk')
+        for author in cls.authors:
+            Comment.objects.create(
+                post=cls.post, author=author, text='Комментарий'
+            )
+
+    def setUp(self):
+        cache.clear()
+        # Справочник групп, кэш объектов и списки последних постов
+        # после очистки заполняются один раз; бюджеты — для прогретых.
+        all_groups()
+        hydrate(Post.objects.values_list('pk', flat=True))
+        recent_posts(author.pk for author in self.authors)
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_query_budgets(self):
+        budgets = (
+            (reverse('posts:index'), 4),
+            (reverse('posts:group_list', args=(self.group.slug,)), 4),
+            (reverse('posts:profile', args=(self.authors[0].username,)), 4),
+            (reverse('posts:post_detail', args=(self.post.pk,)), 6),
+            (reverse('posts:follow_index'), 5),
+            (reverse('posts:search') + '?q=пост', 5),
+        )
+        for url, budget in budgets:
+            with self.subTest(url=url):
+                self.assertQueryBudget(url, budget, self.authorized_client)
+
+    def test_profile_two_queries(self):
+        """Профиль — это шапка автора одним запросом и страница постов."""
+        url = reverse('posts:profile', args=(self.authors[0].username,))
+        with record_queries() as log:
+            response = Client().get(url)
+        self.assertEqual(len(response.context['page_obj']), 3)
+        self.assertLessEqual(len(log), 2, log.report())
+
+    def test_hydration_reads_objects_from_cache(self):
+        """Посты и авторы читаются из кэша, изменения его сбрасывают."""
+        ids = list(
+            Post.objects.order_by('-pk').values_list('pk', flat=True)[:4]
+        )
+        with record_queries() as log:
+            posts = hydrate(ids)
+        self.assertEqual(len(log), 0)
+        self.assertEqual([post.pk for post in posts], ids)
+        self.assertEqual(posts[0].group, self.group)
+        post = Post.objects.get(pk=ids[0])
+        post.text = 'Новый текст'
+        post.save()
+        author = User.objects.get(pk=posts[-1].author_id)
+        author.first_name = 'Имя'
+        author.save()
+        with record_queries() as log:
+            posts = hydrate(ids)
+        self.assertEqual(len(log), 2)
+        self.assertEqual(posts[0].text, 'Новый текст')
+        self.assertEqual(
+            {post.author.get_full_name() for post in posts} - {''}, {'Имя'}
+        )
+
+    def test_group_delete_forgets_cached_posts(self):
+        """После удаления группы ленты показывают её посты без группы."""
+        client = Client()
+        self.assertEqual(client.get(reverse('posts:index')).status_code, 200)
+        Group.objects.get(pk=self.group.pk).delete()
+        response = client.get(reverse('posts:index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(all(
+            post.group is None for post in response.context['page_obj']
+        ))
+
+    def test_attach_skips_unknown_group(self):
+        """Группу, которой нет в справочнике, пост из базы не читает."""
+        post = Post(pk=self.post.pk, author=self.user, group_id=10 ** 6)
+        with record_queries() as log:
+            hydrated = hydrate([self.post.pk])
+            attach([post])
+        self.assertEqual(len(log), 0)
+        self.assertIsNone(post.group)
+        self.assertEqual(hydrated[0].group, self.group)
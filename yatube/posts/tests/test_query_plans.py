@@ -0,0 +1,176 @@
+import re
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\S+)(?: AS \w+)?$')
+DERIVED = re.compile(r'^(?:CO-ROUTINE|MATERIALIZE) (\S+)$')
+TEMP_SORT = 'USE TEMP B-TREE'
+# Справочник групп для выпадающего списка формы читается целиком, а
+# число всех постов складывается из AuthorStats: строка на автора, а не
+# на пост.
+FULL_SCAN_ALLOWED = {'posts_group', 'posts_authorstats'}
+# Досортировка внутри строк, уже упорядоченных индексом по левой части
+# ORDER BY: сортируются только соседние строки с равным началом ключа.
+TEMP_SORT_ALLOWED = {'USE TEMP B-TREE FOR RIGHT PART OF ORDER BY'}
+# Поиск упорядочивает по релевантности только найденные FTS5 строки.
+RANKED_SEARCH = 'SCAN posts_post_fts VIRTUAL TABLE'
+
+
+def scan_targets(sql, name):
+    """Таблицы за псевдонимом Django (U0, T3) в плане SQLite.
+
+    Псевдоним может повторяться в разных подзапросах одного запроса,
+    поэтому возвращаются все таблицы, которые он обозначает.
+    """
+    tables = set(re.findall(rf'"(\w+)" {re.escape(name)}\b', sql))
+    return tables or {name}
+
+
+def plan_violations(sql, steps):
+    """Шаги плана с полным проходом по таблице или сортировкой.
+
+    Проход по индексу (SCAN ... USING INDEX) и поиск по нему (SEARCH)
+    допустимы, как и проход по результату подзапроса (CO-ROUTINE,
+    MATERIALIZE), шаги которого проверяются отдельно.
+    """
+    derived = {
+        match.group(1) for match in map(DERIVED.match, steps) if match
+    }
+    ranked = any(step.startswith(RANKED_SEARCH) for step in steps)
+    violations = []
+    for step in steps:
+        scan = FULL_SCAN.match(step)
+        if scan is not None and scan.group(1) not in derived and not (
+            scan_targets(sql, scan.group(1)) <= FULL_SCAN_ALLOWED
+        ):
+            violations.append(step)
+        if (
+            step.startswith(TEMP_SORT)
+            and step not in TEMP_SORT_ALLOWED
+            and not ranked
+        ):
+            violations.append(step)
+    return violations
+
+
+class QueryPlanTests(TestCase):
+    """Каждый запрос страниц posts/views.py идёт по индексам.
+
+    Проход по индексу (SCAN ... USING INDEX) допустим: он ограничен LIMIT
+    страницы или читает только индекс для COUNT(*). Запрещены полный
+    проход по таблице и сортировка во временном B-дереве.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый текст',
+            group=cls.group,
+        )
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        # Страницы из кэша не делают запросов, проверять было бы нечего.
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_plans_use_indexes(self, client, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, url)
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            with self.subTest(url=url, sql=sql):
+                self.assertEqual(plan_violations(sql, self.explain(sql)), [])
+
+    def test_plan_rules(self):
+        """Полный проход по таблице запрещён, по индексу — нет."""
+        sql = 'SELECT 1 FROM "posts_post" U0'
+        for steps, violations in (
+            (['SCAN posts_post'], ['SCAN posts_post']),
+            (['SCAN U0'], ['SCAN U0']),
+            (['SCAN subquery'], ['SCAN subquery']),
+            (['USE TEMP B-TREE FOR ORDER BY'], [
+                'USE TEMP B-TREE FOR ORDER BY'
+            ]),
+            (['SEARCH posts_post USING INDEX post_date_idx (author_id=?)'],
+             []),
+            (['SCAN posts_post USING COVERING INDEX post_date_idx'], []),
+            (['CO-ROUTINE subquery', 'SCAN subquery'], []),
+            (['SCAN posts_group'], []),
+        ):
+            with self.subTest(steps=steps):
+                self.assertEqual(plan_violations(sql, steps), violations)
+
+    def test_feed_query_plans(self):
+        """Запросы лент и страниц постов не сканируют таблицы целиком."""
+        urls = (
+            (self.reader_client, reverse('posts:index')),
+            (self.reader_client, reverse('posts:index') + '?page=2'),
+            (
+                self.reader_client,
+                reverse('posts:group_list', args=(self.group.slug,)),
+            ),
+            (
+                self.reader_client,
+                reverse('posts:profile', args=(self.author.username,)),
+            ),
+            (
+                self.reader_client,
+                reverse('posts:post_detail', args=(self.post.pk,)),
+            ),
+            (self.reader_client, reverse('posts:follow_index')),
+            (
+                self.author_client,
+                reverse('posts:post_edit', args=(self.post.pk,)),
+            ),
+            (self.author_client, reverse('posts:post_create')),
+            (self.reader_client, reverse('posts:search') + '?q=Тестовый'),
+            (
+                self.staff_client,
+                reverse('posts:group_export', args=(self.group.slug,)),
+            ),
+            (
+                self.author_client,
+                reverse('posts:profile_export', args=(self.author.username,)),
+            ),
+            (
+                self.reader_client,
+                reverse('posts:profile_export', args=(self.reader.username,)),
+            ),
+        )
+        for client, url in urls:
+            self.assert_plans_use_indexes(client, url)
@@ -0,0 +1,199 @@
+import os
+import random
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from faker import Faker
+from mixer.backend.django import mixer
+
+from core.queries import record_queries
+from ..models import Comment, Follow, Group, Post, TimelineEntry, User
+
+# Размеры данных можно уменьшить для быстрого прогона:
+# YATUBE_SCALING_SIZES=10,1000 python manage.py test posts
+SIZES = tuple(
+    int(size) for size in os.environ.get(
+        'YATUBE_SCALING_SIZES', '10,1000,100000'
+    ).split(',')
+)
+# Время ответа зависит от машины и её загрузки, поэтому по умолчанию
+# проверяется только число запросов, а время — по запросу:
+# YATUBE_TIMING_CHECKS=1 python manage.py test posts.tests.test_scaling
+TIMING_CHECKS = os.environ.get('YATUBE_TIMING_CHECKS') == '1'
+AUTHORS = 400
+BATCH_SIZE = 5000
+# Допустимое время ответа на самом большом наборе, секунды.
+DEFAULT_ENVELOPE = 0.5
+ENVELOPES = {
+    # Выгрузка отдаёт все строки, её время растёт с данными по
+    # определению; проверяется только число запросов.
+    'posts:group_export': 30,
+    'posts:profile_export': 30,
+}
+
+
+class ScalingTests(TestCase):
+    """Число запросов страниц не растёт вместе с данными.
+
+    Одни и те же адреса открываются на 10, 1 000 и 100 000 постов,
+    подписок и комментариев: число запросов должно совпадать, а время
+    на самом большом наборе (при TIMING_CHECKS) — укладываться в
+    ENVELOPES.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.faker = Faker('ru_RU')
+        cls.faker.seed_instance(0)
+        cls.random = random.Random(0)
+        cls.texts = [cls.faker.sentence(nb_words=10) for _ in range(200)]
+        cls.viewer = User.objects.create_user(
+            username='viewer', password='password', is_staff=True
+        )
+        cls.group = mixer.blend(Group, slug='scaling')
+        cls.authors = mixer.cycle(AUTHORS).blend(User)
+        cls.author = cls.authors[0]
+        Follow.objects.create(user=cls.viewer, author=cls.author)
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text=cls.texts[0]
+        )
+
+    def grow(self, size):
+        """Досеивает посты, подписки и комментарии до size штук."""
+        self.add_posts(size - Post.objects.count())
+        self.add_follows(size - Follow.objects.count())
+        self.add_comments(size - Comment.objects.count())
+
+    def batches(self, total, build):
+        for start in range(0, max(total, 0), BATCH_SIZE):
+            yield [build() for _ in range(min(BATCH_SIZE, total - start))]
+
+    def add_posts(self, total):
+        last_pk = Post.objects.latest('pk').pk
+        start = timezone.now() - timedelta(days=365)
+        for batch in self.batches(total, lambda: Post(
+            author=self.random.choice(self.authors),
+            group=self.group if self.random.random() < 0.3 else None,
+            text=self.random.choice(self.texts),
+            pub_date=start + timedelta(
+                seconds=self.random.randrange(365 * 24 * 3600)
+            ),
+        )):
+            Post.objects.bulk_create(batch)
+        # bulk_create обходит сигналы: ленту зрителя заполняем сами.
+        TimelineEntry.objects.bulk_create(
+            (
+                TimelineEntry(user=self.viewer, post_id=pk, pub_date=date)
+                for pk, date in Post.objects.filter(
+                    pk__gt=last_pk, author=self.author
+                ).values_list('pk', 'pub_date')
+            ),
+            BATCH_SIZE,
+        )
+
+    def add_follows(self, total):
+        pairs = set(Follow.objects.values_list('user_id', 'author_id'))
+        ids = [user.pk for user in self.authors]
+
+        def follow():
+            while True:
+                pair = tuple(self.random.sample(ids, 2))
+                if pair not in pairs:
+                    pairs.add(pair)
+                    return Follow(user_id=pair[0], author_id=pair[1])
+        for batch in self.batches(total, follow):
+            Follow.objects.bulk_create(batch)
+
+    def add_comments(self, total):
+        last_pk = Post.objects.latest('pk').pk
+        for batch in self.batches(total, lambda: Comment(
+            post_id=self.random.randint(1, last_pk),
+            author=self.random.choice(self.authors),
+            text=self.random.choice(self.texts),
+        )):
+            Comment.objects.bulk_create(batch)
+
+    def urls(self):
+        """Все адреса posts, users и about: имя, метод, путь."""
+        author = self.author.username
+        return [
+            ('posts:index', 'get', reverse('posts:index')),
+            ('posts:group_list', 'get',
+             reverse('posts:group_list', args=(self.group.slug,))),
+            ('posts:group_export', 'get',
+             reverse('posts:group_export', args=(self.group.slug,))),
+            ('posts:profile', 'get', reverse('posts:profile', args=(author,))),
+            ('posts:profile_export', 'get',
+             reverse('posts:profile_export', args=(author,))),
+            ('posts:search', 'get',
+             reverse('posts:search') + '?q=' + self.texts[0].split()[0]),
+            ('posts:post_detail', 'get',
+             reverse('posts:post_detail', args=(self.post.pk,))),
+            ('posts:post_create', 'get', reverse('posts:post_create')),
+            ('posts:post_edit', 'get',
+             reverse('posts:post_edit', args=(self.post.pk,))),
+            ('posts:add_comment', 'post',
+             reverse('posts:add_comment', args=(self.post.pk,))),
+            ('posts:follow_index', 'get', reverse('posts:follow_index')),
+            ('posts:profile_unfollow', 'get',
+             reverse('posts:profile_unfollow', args=(author,))),
+            ('posts:profile_follow', 'get',
+             reverse('posts:profile_follow', args=(author,))),
+            ('about:author', 'get', reverse('about:author')),
+            ('about:tech', 'get', reverse('about:tech')),
+            ('users:signup', 'get', reverse('users:signup')),
+            ('users:login', 'get', reverse('users:login')),
+            ('users:password_change', 'get',
+             reverse('users:password_change')),
+            ('users:password_change_done', 'get',
+             reverse('users:password_change_done')),
+            ('users:password_reset', 'get', reverse('users:password_reset')),
+            ('users:password_reset_done', 'get',
+             reverse('users:password_reset_done')),
+            ('users:password_reset_confirm', 'get',
+             reverse('users:password_reset_confirm', args=('MQ', 'token'))),
+            ('users:password_reset_complete', 'get',
+             reverse('users:password_reset_complete')),
+            ('users:logout', 'get', reverse('users:logout')),
+        ]
+
+    def measure(self, client, method, url):
+        cache.clear()
+        started = time.perf_counter()
+        with record_queries() as log:
+            response = getattr(client, method)(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, url)
+        return len(log), time.perf_counter() - started
+
+    def test_query_counts_do_not_grow(self):
+        counts = {}
+        for size in SIZES:
+            self.grow(size)
+            client = Client()
+            client.force_login(self.viewer)
+            # Первый проход создаёт ленивые строки счётчиков и т. п.;
+            # отписка и подписка идут парой и возвращают данные назад.
+            for name, method, url in self.urls():
+                getattr(client, method)(url)
+                client.force_login(self.viewer)
+            for name, method, url in self.urls():
+                queries, seconds = self.measure(client, method, url)
+                client.force_login(self.viewer)
+                counts.setdefault(name, []).append(queries)
+                if TIMING_CHECKS and size == SIZES[-1]:
+                    with self.subTest(view=name, size=size):
+                        self.assertLess(
+                            seconds, ENVELOPES.get(name, DEFAULT_ENVELOPE)
+                        )
+        for name, by_size in counts.items():
+            with self.subTest(view=name):
+                self.assertEqual(
+                    len(set(by_size)), 1, f'{name}: {by_size} при {SIZES}'
+                )
@@ -1,13 +1,32 @@
+import base64
+import csv
+import json
 import shutil
 import tempfile
+import time
+import warnings
+from datetime import timedelta
+from io import StringIO
 
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import Client, RequestFactory, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 
-from ..models import Follow, Group, Post, User
+from .. import caching, recent, timeline
+from ..counters import group_posts_total, recount_group
+from ..models import (
+    AuthorStats, Comment, Follow, Group, HotAuthor, Post, TimelineEntry, User
+)
+from ..timeline import Timeline
+from ..utils import (
+    FeedPaginator, PostIds, decode_cursor, encode_cursor, estimate_count,
+    page_window
+)
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -127,16 +146,101 @@ class PostContextTests(TestCase):
         add_content = self.author_client.get(
             reverse('posts:index')
         ).content
-        post.delete()
-        delete_content = self.author_client.get(
+        Post.objects.filter(pk=post.pk).update(text='Изменено мимо сигналов')
+        cached_content = self.author_client.get(
             reverse('posts:index')
         ).content
-        self.assertEqual(add_content, delete_content)
-        cache.clear()
-        cache_clear = self.author_client.get(
+        self.assertEqual(add_content, cached_content)
+        post.delete()
+        delete_content = self.author_client.get(
             reverse('posts:index')
         ).content
-        self.assertNotEqual(add_content, cache_clear)
+        self.assertNotEqual(add_content, delete_content)
+
+    def test_cache_feeds_invalidated_by_new_post(self):
+        """Новый пост сразу виден в закэшированных лентах."""
+        urls = (
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+        )
+        before = [self.author_client.get(url).content for url in urls]
+        Post.objects.create(
+            text='Свежий пост',
+            author=self.author,
+            group=self.group,
+        )
+        for url, content in zip(urls, before):
+            with self.subTest(url=url):
+                response = self.author_client.get(url)
+                self.assertNotEqual(response.content, content)
+                self.assertContains(response, 'Свежий пост')
+
+    def test_cache_feeds_invalidated_by_author_rename(self):
+        """Новое имя автора сразу видно в закэшированных лентах."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+        )
+        for url in urls:
+            self.author_client.get(url)
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = 'Переименованный'
+        author.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.author_client.get(url), 'Переименованный'
+                )
+
+    def test_cache_serves_stale_page_while_rebuilding(self):
+        """Пока страницу перестраивает другой запрос, отдаётся копия."""
+        url = reverse('posts:index')
+        cached = self.author_client.get(url).content
+        Post.objects.create(
+            text='Пост во время перестройки',
+            author=self.author,
+        )
+        request = RequestFactory().get(url)
+        request.user = self.author
+        cache.add(
+            f'{caching.page_key(request, "index")}:lock',
+            True,
+            settings.FEED_CACHE_LOCK_TIMEOUT,
+        )
+        self.assertEqual(self.author_client.get(url).content, cached)
+        cache.delete(f'{caching.page_key(request, "index")}:lock')
+        self.assertContains(
+            self.author_client.get(url), 'Пост во время перестройки'
+        )
+
+    def test_cache_refreshes_expired_entry(self):
+        """Истёкшая запись всегда перестраивается досрочно."""
+        entry = {'expires': time.time() - 1, 'delta': 0.5}
+        self.assertTrue(caching.needs_refresh(entry))
+        entry = {'expires': time.time() + 3600, 'delta': 0.0}
+        self.assertFalse(caching.needs_refresh(entry))
+
+    def test_post_cards_cached(self):
+        """Карточка поста берётся из кэша, пока пост не изменился."""
+        cards = Template(
+            '{% load post_cards %}{% cached_cards posts as cards %}'
+            '{% for card in cards %}{{ card }}{% endfor %}'
+        )
+        key = caching.card_key(self.post, 'posts/includes/post_card.html')
+        cards.render(Context({'posts': [self.post]}))
+        self.assertIn(self.post.text, cache.get(key))
+        cache.set(key, '<article>из кэша</article>')
+        self.assertEqual(
+            cards.render(Context({'posts': [self.post]})),
+            '<article>из кэша</article>',
+        )
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Новый текст карточки'
+        self.assertIn(
+            'Новый текст карточки',
+            cards.render(Context({'posts': [post]})),
+        )
 
 
 class PaginatorTests(TestCase):
@@ -159,6 +263,7 @@ class PaginatorTests(TestCase):
         cls.post = Post.objects.bulk_create(cls.post_list)
 
     def setUp(self):
+        cache.clear()
         self.author_client = Client()
         self.author_client.force_login(self.author)
 
@@ -180,6 +285,177 @@ class PaginatorTests(TestCase):
                     context = response.context.get('page_obj')
                     self.assertEqual(len(context), number_posts)
 
+    def test_cursor_pages_cover_feed(self):
+        """Курсорные страницы проходят ленту целиком и без повторов."""
+        first_page = self.author_client.get(
+            reverse('posts:group_list', args=(self.group.slug,))
+        ).context.get('page_obj')
+        token = encode_cursor(first_page[len(first_page) - 1])
+        second_page = self.author_client.get(
+            reverse('posts:group_list', args=(self.group.slug,)),
+            {'after': token},
+        ).context.get('page_obj')
+        self.assertEqual(len(second_page), settings.TEST_PAGINATOR)
+        self.assertFalse(second_page.has_next())
+        self.assertTrue(second_page.has_previous())
+        seen = [post.pk for post in first_page] + [
+            post.pk for post in second_page
+        ]
+        self.assertEqual(
+            seen,
+            list(Post.objects.order_by('-pub_date', '-pk').values_list(
+                'pk', flat=True
+            )),
+        )
+        back_page = self.author_client.get(
+            reverse('posts:group_list', args=(self.group.slug,)),
+            {'before': encode_cursor(second_page[0])},
+        ).context.get('page_obj')
+        self.assertEqual(list(back_page), list(first_page))
+
+    def test_cursor_datetime_is_aware(self):
+        """Курсор даёт время с поясом, и без смещения в токене тоже."""
+        post = Post.objects.earliest('pub_date')
+        pub_date, pk = decode_cursor(encode_cursor(post))
+        self.assertEqual((pub_date, pk), (post.pub_date, post.pk))
+        naive = timezone.localtime(post.pub_date, timezone.utc).replace(
+            tzinfo=None
+        )
+        token = base64.urlsafe_b64encode(
+            f'{naive.isoformat()}|{post.pk}'.encode()
+        ).decode()
+        self.assertEqual(decode_cursor(token), (post.pub_date, post.pk))
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', RuntimeWarning)
+            response = self.author_client.get(
+                reverse('posts:group_list', args=(self.group.slug,)),
+                {'after': token},
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_page_window(self):
+        """Вместо всех номеров страниц — окно вокруг текущей и края."""
+        self.assertEqual(
+            list(page_window(25, 50)),
+            [1, None, 23, 24, 25, 26, 27, None, 50],
+        )
+        self.assertEqual(list(page_window(1, 3)), [1, 2, 3])
+
+    @override_settings(NUMBER_OBJECTS=1)
+    def test_paginator_renders_window(self):
+        response = self.author_client.get(
+            reverse('posts:index'), {'page': 7}
+        )
+        self.assertContains(response, '&hellip;', count=2)
+        self.assertContains(response, '?page=13"')
+        self.assertNotContains(response, '?page=3"')
+
+    def test_feed_count_cached_until_posts_change(self):
+        """Число постов ленты берётся из кэша до создания или удаления."""
+        def count():
+            return FeedPaginator(
+                self.group.posts.all(),
+                settings.NUMBER_OBJECTS,
+                [f'group:{self.group.slug}'],
+            ).count
+
+        self.assertEqual(count(), settings.TEST_POSTS)
+        # bulk_create обходит сигналы: закэшированное число не меняется.
+        Post.objects.bulk_create([
+            Post(author=self.author, text='Мимо сигналов', group=self.group)
+        ])
+        self.assertEqual(count(), settings.TEST_POSTS)
+        post = Post.objects.create(
+            author=self.author, text='Новый', group=self.group
+        )
+        self.assertEqual(count(), settings.TEST_POSTS + 2)
+        post.delete()
+        self.assertEqual(count(), settings.TEST_POSTS + 1)
+
+    def test_estimate_count_above_limit(self):
+        """Выше порога число берётся из счётчика, до порога — точное."""
+        posts = Post.objects.filter(group=self.group)
+        self.assertEqual(
+            estimate_count(posts, settings.TEST_POSTS), settings.TEST_POSTS
+        )
+        # bulk_create не создал строку GroupStats: не меньше limit + 1.
+        stored = group_posts_total(self.group.pk)
+        self.assertEqual(estimate_count(posts, 3, stored), 4)
+        recount_group(self.group.pk)
+        self.assertEqual(
+            estimate_count(posts, 3, stored), settings.TEST_POSTS
+        )
+
+    @override_settings(FEED_COUNT_LIMIT=5)
+    def test_estimate_count_ids_against_date_order(self):
+        """id, растущие против дат (как после export/import), не ломают
+        оценку: номера страниц лент остаются в их настоящих границах."""
+        group = Group.objects.create(title='Новая', slug='new')
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.author)
+        start = timezone.now()
+        for number in range(40):
+            post = Post.objects.create(
+                author=self.author, text='Новый', group=group
+            )
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=start - timedelta(days=number)
+            )
+        posts = group.posts.all()
+        self.assertEqual(
+            estimate_count(posts, 5, group_posts_total(group.pk)), 40
+        )
+        self.assertGreater(Timeline(reader).estimate_count(5), 5)
+        total = Post.objects.count()
+        for url, count in (
+            (reverse('posts:index'), total),
+            (reverse('posts:group_list', args=(group.slug,)), 40),
+        ):
+            with self.subTest(url=url):
+                response = self.author_client.get(url, {'page': 3})
+                self.assertEqual(response.status_code, 200)
+                page_obj = response.context['page_obj']
+                self.assertEqual(page_obj.number, 3)
+                self.assertEqual(page_obj.paginator.count, count)
+
+    def test_page_past_overestimated_end(self):
+        """Пустая страница за завышенным концом ленты заменяется
+        настоящей последней."""
+        paginator = FeedPaginator(
+            PostIds(self.group.posts.all()), settings.NUMBER_OBJECTS,
+            total=100,
+        )
+        page_obj = paginator.get_page(5)
+        self.assertEqual(page_obj.number, 2)
+        self.assertEqual(len(page_obj), settings.TEST_PAGINATOR)
+        self.assertFalse(page_obj.has_next())
+        self.assertEqual(paginator.count, settings.TEST_POSTS)
+
+    def test_cursor_broken_token(self):
+        """Испорченный токен курсора отдаёт первую страницу."""
+        response = self.author_client.get(
+            reverse('posts:profile', args=(self.author.username,)),
+            {'after': 'не-токен'},
+        )
+        page_obj = response.context.get('page_obj')
+        self.assertEqual(len(page_obj), settings.NUMBER_OBJECTS)
+        self.assertFalse(page_obj.has_previous())
+
+    def test_cursor_after_last_post(self):
+        """Курсор самого старого поста отдаёт первую страницу."""
+        oldest = Post.objects.order_by('pub_date', 'pk').first()
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:profile', args=(self.author.username,)),
+        ):
+            with self.subTest(url=url):
+                response = self.author_client.get(
+                    url, {'after': encode_cursor(oldest)}
+                )
+                page_obj = response.context.get('page_obj')
+                self.assertEqual(len(page_obj), settings.NUMBER_OBJECTS)
+                self.assertFalse(page_obj.has_previous())
+
 
 class FollowTest(TestCase):
     @classmethod
@@ -217,6 +493,36 @@ class FollowTest(TestCase):
         self.assertEqual(follow.author, self.author)
         self.assertEqual(follow.user, self.follower)
 
+    def test_profile_follow_state(self):
+        """Шапка профиля обновляется после подписки."""
+        url = reverse('posts:profile', args=(self.author.username,))
+        author = self.author_client.get(url).context['author']
+        self.assertFalse(author.is_following)
+        self.assertEqual(author.followers_count, 0)
+        self.assertEqual(author.posts_count, 1)
+        Follow.objects.create(user=self.follower, author=self.author)
+        author = self.author_client.get(url).context['author']
+        self.assertTrue(author.is_following)
+        self.assertEqual(author.followers_count, 1)
+
+    def test_profile_counts_from_author_stats(self):
+        """Счётчики шапки профиля читаются из AuthorStats, а в кэш
+        попадают только нужные шапке поля автора."""
+        AuthorStats.objects.update_or_create(
+            user=self.author,
+            defaults={'posts_count': 42, 'followers_count': 7},
+        )
+        url = reverse('posts:profile', args=(self.author.username,))
+        author = self.author_client.get(url).context['author']
+        self.assertEqual(author.posts_count, 42)
+        self.assertEqual(author.followers_count, 7)
+        self.assertIn('password', author.get_deferred_fields())
+        AuthorStats.objects.filter(user=self.author).delete()
+        cache.clear()
+        author = self.author_client.get(url).context['author']
+        self.assertEqual(author.posts_count, 1)
+        self.assertTrue(AuthorStats.objects.filter(user=self.author).exists())
+
     def test_unfollow(self):
         """Проверяем, что автор может отписаться."""
         Follow.objects.create(
@@ -257,3 +563,242 @@ class FollowTest(TestCase):
             reverse('posts:follow_index')
         )
         self.assertNotIn(post, response.context['page_obj'])
+
+    def test_unfollow_trims_timeline(self):
+        """После отписки посты автора пропадают из ленты."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.follower, post=self.post
+            ).exists()
+        )
+        Follow.objects.filter(user=self.follower).delete()
+        response = self.author_client.get(reverse('posts:follow_index'))
+        self.assertNotIn(self.post, response.context['page_obj'])
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.follower).exists()
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_hot_author_read_on_fan_in(self):
+        """Посты популярного автора читаются без рассылки по лентам."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(
+            author=self.author,
+            text='Пост популярного автора',
+        )
+        self.assertTrue(HotAuthor.objects.filter(author=self.author).exists())
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=post).exists()
+        )
+        response = self.author_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [post, self.post]
+        )
+
+    def test_refresh_hot_author_without_duplicates(self):
+        """Автор, ставший «горячим» после загрузки, не двоит ленту."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(author=self.author, text='Второй')
+        with override_settings(TIMELINE_FANOUT_LIMIT=0):
+            timeline.refresh(self.author.pk)
+        self.assertTrue(HotAuthor.objects.filter(author=self.author).exists())
+        feed = Timeline(self.follower)
+        self.assertEqual(feed.ids(limit=10), [post.pk, self.post.pk])
+        self.assertEqual(feed.count(), 2)
+
+    def test_follow_feed_merges_recent_posts(self):
+        """Первые страницы ленты — слияние списков, порядок как у Timeline."""
+        authors = [
+            User.objects.create(username=f'merge-{number}')
+            for number in range(3)
+        ]
+        for author in [self.author, *authors]:
+            Follow.objects.create(user=self.follower, author=author)
+        for number in range(settings.NUMBER_OBJECTS):
+            Post.objects.create(
+                author=authors[number % 3], text=f'Пост {number}'
+            )
+        feed = recent.FollowFeed(self.follower)
+        expected = Timeline(self.follower)[:settings.NUMBER_OBJECTS]
+        self.assertEqual(feed[:settings.NUMBER_OBJECTS], expected)
+        self.assertEqual(feed[2:5], expected[2:5])
+        with override_settings(FOLLOW_MERGE_MAX_AUTHORS=2):
+            self.assertEqual(
+                recent.FollowFeed(self.follower)[:3], expected[:3]
+            )
+        response = self.author_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']),
+            expected[:settings.NUMBER_OBJECTS],
+        )
+
+    @override_settings(NUMBER_OBJECTS=1, FOLLOW_MERGE_PAGES=2)
+    def test_recent_posts_follow_create_and_delete(self):
+        """Создание и удаление поста сбрасывают список автора."""
+        def recent_ids():
+            posts = recent.recent_posts([self.author.pk])[self.author.pk]
+            return [pk for _, pk in posts]
+
+        self.assertEqual(recent_ids(), [self.post.pk])
+        first = Post.objects.create(author=self.author, text='Первый')
+        self.assertIsNone(
+            cache.get(recent.RECENT_KEY.format(self.author.pk))
+        )
+        second = Post.objects.create(author=self.author, text='Второй')
+        self.assertEqual(recent_ids(), [second.pk, first.pk])
+        # Удаление сбрасывает ключ, список читается заново.
+        second.delete()
+        self.assertIsNone(
+            cache.get(recent.RECENT_KEY.format(self.author.pk))
+        )
+        self.assertEqual(recent_ids(), [first.pk, self.post.pk])
+        first.delete()
+        self.assertEqual(recent_ids(), [self.post.pk])
+
+    def test_follow_feed_benchmark(self):
+        """Замер сравнивает три способа и откатывает свои данные."""
+        posts = Post.objects.count()
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            'follow_feed_benchmark', authors=[3], posts=2, other_posts=5,
+            repeat=1, stdout=stdout, stderr=stderr,
+        )
+        self.assertEqual(len(stdout.getvalue().splitlines()), 3)
+        self.assertEqual(stderr.getvalue(), '')
+        self.assertEqual(Post.objects.count(), posts)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.author, text=f'Пряник номер {number}')
+            for number in range(settings.TEST_POSTS)
+        )
+        cls.relevant = Post.objects.create(
+            author=cls.author, text='Пряники, пряники и ещё раз пряники'
+        )
+
+    def search(self, query, **params):
+        return self.client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+
+    def test_search_ranks_and_paginates(self):
+        """Поиск находит слова по префиксу, лучшие совпадения первыми."""
+        response = self.search('ПРЯНИК')
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, settings.TEST_POSTS + 1)
+        self.assertEqual(page_obj[0], self.relevant)
+        self.assertContains(response, 'q=%D0%9F%D0%A0%D0%AF%D0%9D%D0%98%D0%9A')
+        second = self.search('ПРЯНИК', page=2).context['page_obj']
+        self.assertEqual(
+            len(page_obj) + len(second), settings.TEST_POSTS + 1
+        )
+
+    def test_search_index_follows_changes(self):
+        """Индекс обновляется при правке и удалении постов."""
+        post = Post.objects.get(text='Пряник номер 0')
+        Post.objects.filter(pk=post.pk).update(text='Печенье')
+        self.assertEqual(
+            list(self.search('печенье').context['page_obj']), [post]
+        )
+        self.assertNotIn(post, self.search('пряник').context['page_obj'])
+        Post.objects.filter(pk=post.pk).delete()
+        self.assertEqual(len(self.search('печенье').context['page_obj']), 0)
+
+    def test_search_ignores_fts_syntax(self):
+        """Операторы FTS5 во вводе не ломают запрос."""
+        for query in ('"', 'AND OR NOT', 'text:*', '(пряник'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query).status_code, 200)
+
+    def test_admin_search_uses_index(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'раз'}
+        )
+        self.assertEqual(list(response.context['cl'].result_list), [
+            self.relevant
+        ])
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Текст поста'
+        )
+        Comment.objects.create(
+            post=cls.post, author=cls.author, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.author, author=cls.reader)
+
+    def export(self, user, url, **params):
+        self.client.force_login(user)
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_author_exports_own_archive(self):
+        """Автор скачивает свои посты, комментарии и подписки."""
+        content = self.export(
+            self.author,
+            reverse('posts:profile_export', args=(self.author.username,)),
+        )
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(
+            [row['type'] for row in rows], ['post', 'comment', 'follow']
+        )
+        self.assertEqual(rows[0]['id'], self.post.pk)
+        self.assertEqual(rows[0]['group'], self.group.slug)
+        self.assertEqual(rows[2]['author'], self.reader.username)
+
+    def test_staff_exports_group_csv(self):
+        content = self.export(
+            self.staff,
+            reverse('posts:group_export', args=(self.group.slug,)),
+            format='csv',
+        )
+        rows = list(csv.DictReader(content.splitlines()))
+        self.assertEqual([row['type'] for row in rows], ['post', 'comment'])
+        self.assertEqual(rows[1]['post'], str(self.post.pk))
+
+    def test_export_forbidden_for_others(self):
+        self.client.force_login(self.reader)
+        for url in (
+            reverse('posts:profile_export', args=(self.author.username,)),
+            reverse('posts:group_export', args=(self.group.slug,)),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_export_command_round_trips(self):
+        """Выгрузка читается командой import_posts."""
+        out = StringIO()
+        call_command(
+            'export_posts', '--author', self.author.username,
+            stdout=out, stderr=StringIO(),
+        )
+        Comment.objects.all().delete()
+        Post.objects.all().delete()
+        path = f'{tempfile.mkdtemp(dir=settings.BASE_DIR)}/archive.jsonl'
+        with open(path, 'w', encoding='utf-8') as archive:
+            archive.write(out.getvalue())
+        call_command('import_posts', path, stdout=StringIO())
+        shutil.rmtree(path.rsplit('/', 1)[0])
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.pub_date, self.post.pub_date)
+        self.assertEqual(post.comments.count(), 1)
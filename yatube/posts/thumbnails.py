@@ -0,0 +1,119 @@
+from django.db import transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import caching
+from .models import ThumbnailTask
+
+# Размеры миниатюр, которые показывают шаблоны карточек и поста.
+POST_THUMBNAILS = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+
+
+def thumbnail_options(source, options):
+    """Опции миниатюры в том же виде, что и у ThumbnailBackend sorl.
+
+    От них зависит имя файла миниатюры, поэтому набор должен совпадать
+    с тем, что собирает get_thumbnail.
+    """
+    backend = default.backend
+    options = dict(options)
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def thumbnail_file(source, geometry, options):
+    name = default.backend._get_thumbnail_filename(
+        source, geometry, thumbnail_options(source, options)
+    )
+    return ImageFile(name, default.storage)
+
+
+def ready_thumbnail(file_, geometry, **options):
+    """Готовая миниатюра из KV-хранилища sorl или None.
+
+    В отличие от get_thumbnail никогда не строит миниатюру сама.
+    """
+    if not file_:
+        return None
+    return default.kvstore.get(
+        thumbnail_file(ImageFile(file_), geometry, options)
+    )
+
+
+def enqueue(post):
+    if post.image:
+        ThumbnailTask.objects.update_or_create(
+            post=post, defaults={'attempts': 0}
+        )
+
+
+def render_thumbnails(image_name):
+    """Создаёт файлы миниатюр POST_THUMBNAILS для одной картинки.
+
+    Выполняется в дочернем процессе и не пишет в KV-хранилище: вернёт
+    имя и размер исходника и список (имя, размер) миниатюр, а записи
+    делает родитель пачками.
+    """
+    source = ImageFile(image_name, default.storage)
+    source_image = None
+    thumbnails = []
+    try:
+        for geometry, options in POST_THUMBNAILS:
+            options = thumbnail_options(source, options)
+            thumbnail = thumbnail_file(source, geometry, options)
+            if thumbnail.exists():
+                thumbnail.set_size()
+            else:
+                if source_image is None:
+                    source_image = default.engine.get_image(source)
+                    source.set_size(
+                        default.engine.get_image_size(source_image)
+                    )
+                options['image_info'] = default.engine.get_image_info(
+                    source_image
+                )
+                default.backend._create_thumbnail(
+                    source_image, geometry, options, thumbnail
+                )
+            thumbnails.append((thumbnail.name, thumbnail.size))
+        source.set_size()
+    finally:
+        if source_image is not None:
+            default.engine.cleanup(source_image)
+    return image_name, source.size, thumbnails
+
+
+def store_thumbnails(results):
+    """Записывает результаты render_thumbnails в KV-хранилище одной
+    транзакцией."""
+    with transaction.atomic():
+        for image_name, size, thumbnails in results:
+            source = ImageFile(image_name, default.storage)
+            source.set_size(size)
+            default.kvstore.set(source)
+            for name, thumbnail_size in thumbnails:
+                thumbnail = ImageFile(name, default.storage)
+                thumbnail.set_size(thumbnail_size)
+                default.kvstore.set(thumbnail, source)
+
+
+def thumbnails_ready(posts):
+    """Сбрасывает кэш страниц и карточек, где стояла заглушка."""
+    scopes = set()
+    for post in posts:
+        caching.forget_cards(post)
+        scopes.update(caching.post_scopes(
+            post, post.group.slug if post.group_id else None
+        ))
+    caching.bump(*scopes)
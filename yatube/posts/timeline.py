@@ -0,0 +1,159 @@
+from heapq import merge
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from .counters import author_stats, followed_posts_total, recount_author
+from .hydration import hydrate
+from .models import Follow, HotAuthor, Post, TimelineEntry
+from .utils import estimate_count, keyset
+
+TIMELINE_KEY = ('pub_date', 'post_id')
+
+
+def _entries(post_ids, user_ids):
+    return (
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in post_ids
+        for user_id in user_ids
+    )
+
+
+def _bulk_insert(entries):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= settings.TIMELINE_BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора.
+
+    Авторы, у которых подписчиков больше TIMELINE_FANOUT_LIMIT, становятся
+    «горячими»: их посты не копируются, а читаются из posts_post при
+    показе ленты.
+    """
+    if HotAuthor.objects.filter(author_id=post.author_id).exists():
+        return
+    stats = author_stats(post.author_id)
+    if stats.followers_count > settings.TIMELINE_FANOUT_LIMIT:
+        HotAuthor.objects.get_or_create(
+            author_id=post.author_id,
+            defaults={'since': post.pub_date},
+        )
+        return
+    _bulk_insert(_entries(
+        [(post.pk, post.pub_date)],
+        Follow.objects.filter(author_id=post.author_id).values_list(
+            'user_id', flat=True
+        ).iterator(),
+    ))
+
+
+def backfill(user_id, author_id):
+    """Копирует последние посты автора в ленту нового подписчика."""
+    posts = Post.objects.filter(author_id=author_id)
+    hot = HotAuthor.objects.filter(author_id=author_id).first()
+    if hot is not None:
+        posts = posts.filter(pub_date__lt=hot.since)
+    posts = posts.order_by('-pub_date')[:settings.TIMELINE_BACKFILL]
+    _bulk_insert(_entries(posts.values_list('pk', 'pub_date'), [user_id]))
+
+
+def trim(user_id, author_id):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def refresh(author_id):
+    """Догоняет ленты подписчиков автора после загрузки в обход сигналов.
+
+    Пересчитывает счётчики автора, при необходимости делает его
+    «горячим» и докладывает его посты в ленты всех подписчиков.
+    """
+    stats = recount_author(author_id)
+    if stats.followers_count > settings.TIMELINE_FANOUT_LIMIT:
+        first = Post.objects.filter(author_id=author_id).aggregate(
+            first=Min('pub_date')
+        )['first']
+        _, created = HotAuthor.objects.get_or_create(
+            author_id=author_id,
+            defaults={'since': first or timezone.now()},
+        )
+        if created:
+            # Все посты автора теперь читаются из posts_post, разосланные
+            # раньше копии дали бы в лентах дубли.
+            TimelineEntry.objects.filter(post__author_id=author_id).delete()
+    followers = Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True
+    )
+    for user_id in followers.iterator():
+        backfill(user_id, author_id)
+
+
+class Timeline:
+    """Лента подписок пользователя.
+
+    Основная часть читается из материализованной таблицы TimelineEntry
+    одним проходом по индексу (user, -pub_date), посты «горячих» авторов
+    подмешиваются из posts_post слиянием двух упорядоченных потоков.
+    Из базы читаются только даты и id, посты собирает hydrate.
+    Объект совместим с Paginator и CursorPaginator.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.entries = TimelineEntry.objects.filter(user=user)
+        hot = HotAuthor.objects.filter(author__following__user=user)
+        condition = Q()
+        for author_id, since in hot.values_list('author_id', 'since'):
+            condition |= Q(author_id=author_id, pub_date__gte=since)
+        if condition:
+            self.hot_posts = Post.objects.filter(condition)
+        else:
+            self.hot_posts = Post.objects.none()
+
+    def count(self):
+        return self.entries.count() + self.hot_posts.count()
+
+    def __len__(self):
+        return self.count()
+
+    def estimate_count(self, limit):
+        # Счётчик постов всех авторов подписки покрывает и «горячих».
+        entries = estimate_count(
+            self.entries, limit, followed_posts_total(self.user),
+            ('-pub_date', '-post_id'),
+        )
+        if entries > limit:
+            return entries
+        return entries + estimate_count(self.hot_posts, limit)
+
+    def ids(self, cursor=None, backwards=False, limit=None):
+        """id постов ленты: слияние двух потоков пар (pub_date, id)."""
+        entries = keyset(
+            self.entries.values_list(*TIMELINE_KEY),
+            cursor, backwards, limit, fields=TIMELINE_KEY,
+        )
+        posts = keyset(
+            self.hot_posts.values_list('pub_date', 'pk'),
+            cursor, backwards, limit,
+        )
+        merged = merge(entries, posts, reverse=not backwards)
+        return [pk for _, pk in islice(merged, limit)]
+
+    def keyset(self, cursor=None, backwards=False, limit=None):
+        return hydrate(self.ids(cursor, backwards, limit))
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        return hydrate(self.ids(limit=index.stop)[index])
@@ -1,8 +1,270 @@
+import base64
+import binascii
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.paginator import Page, Paginator
+from django.db.models import Count, Max, Q, QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from . import caching
+from .hydration import hydrate
+
+CURSOR_ORDERING = ('-pub_date', '-pk')
+
+
+def encode_cursor(post):
+    """Непрозрачный токен позиции поста в ленте: (pub_date, id)."""
+    pub_date = timezone.localtime(post.pub_date, timezone.utc)
+    raw = f'{pub_date.isoformat()}|{post.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Разбирает токен курсора, для испорченного токена вернёт None."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        pub_date, pk = raw.decode().split('|')
+        pub_date, pk = parse_datetime(pub_date), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if pub_date is None:
+        return None
+    if timezone.is_naive(pub_date):
+        # Токен без смещения: время в UTC, как его пишет encode_cursor.
+        pub_date = timezone.make_aware(pub_date, timezone.utc)
+    return pub_date, pk
+
+
+def keyset(queryset, cursor=None, backwards=False, limit=None,
+           fields=('pub_date', 'pk')):
+    """Выборка ``limit`` объектов по одну сторону от курсора."""
+    date_field, id_field = fields
+    lookup = 'gt' if backwards else 'lt'
+    if cursor is not None:
+        pub_date, pk = cursor
+        queryset = queryset.filter(
+            Q(**{f'{date_field}__{lookup}': pub_date})
+            | Q(**{date_field: pub_date, f'{id_field}__{lookup}': pk})
+        )
+    if backwards:
+        queryset = queryset.order_by(date_field, id_field)
+    else:
+        queryset = queryset.order_by(f'-{date_field}', f'-{id_field}')
+    return queryset[:limit]
+
+
+class CursorPage(Page):
+    """Страница курсорной пагинации, совместимая с шаблоном паджинатора.
+
+    Номера у такой страницы нет: соседние страницы адресуются токенами
+    ``?after=``/``?before=``, которые строятся по крайним постам.
+    """
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по (pub_date, id) без COUNT(*) и OFFSET.
+
+    Любая страница выбирается одним запросом по индексу, поэтому
+    глубокие страницы стоят столько же, сколько первая.
+    """
+
+    def _fetch(self, cursor=None, backwards=False):
+        limit = self.per_page + 1
+        if hasattr(self.object_list, 'keyset'):
+            rows = self.object_list.keyset(cursor, backwards, limit)
+        else:
+            rows = keyset(self.object_list, cursor, backwards, limit)
+        rows = list(rows)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+        return rows, has_more
+
+    def get_page(self, after=None, before=None):
+        if before:
+            cursor = decode_cursor(before)
+            if cursor is not None:
+                rows, has_previous = self._fetch(cursor, backwards=True)
+                if has_previous:
+                    return CursorPage(rows, self, True, True)
+        elif after:
+            cursor = decode_cursor(after)
+            if cursor is not None:
+                rows, has_next = self._fetch(cursor)
+                # За последним постом ничего нет (устаревшая ссылка
+                # после удаления): пустая страница без крайних постов
+                # не построит ссылок, отдаём первую.
+                if rows:
+                    return CursorPage(rows, self, has_next, True)
+        rows, has_next = self._fetch()
+        return CursorPage(rows, self, has_next, False)
+
+
+def estimate_count(queryset, limit, stored=None, ordering=CURSOR_ORDERING):
+    """Число строк выборки: точное до limit, дальше — по счётчику.
+
+    Считаются только limit + 1 первых в порядке ленты строк, это проход
+    по тому же индексу, что и у страниц. Если выборка больше, её размер
+    берёт хранимый счётчик stored — подзапрос к AuthorStats или
+    GroupStats (см. counters.site_posts_total), который выполняется тем
+    же запросом. Строки счётчиков создаются лениво и могут отставать,
+    поэтому ответ не меньше limit + 1; без счётчика он и есть ответ.
+    """
+    sample = queryset.order_by(*ordering)
+    fields, aggregates = ['pk'], {'rows': Count('pk')}
+    if stored is not None:
+        sample = sample.annotate(stored=stored)
+        fields.append('stored')
+        aggregates['total'] = Max('stored')
+    sample = sample.values(*fields)[:limit + 1].aggregate(**aggregates)
+    rows = sample['rows'] or 0
+    if rows <= limit:
+        return rows
+    return max(sample.get('total') or 0, limit + 1)
+
+
+class PostIds:
+    """Лента постов, которая читает из базы только id.
+
+    Срезы Paginator и keyset CursorPaginator выбирают упорядоченные id
+    страницы, а посты по ним собирает hydrate из общего кэша объектов.
+    """
+
+    def __init__(self, queryset, stored=None):
+        self.queryset = queryset.order_by(*CURSOR_ORDERING)
+        self.stored = stored
+
+    def count(self):
+        return self.queryset.count()
+
+    def __len__(self):
+        return self.count()
+
+    def estimate_count(self, limit):
+        return estimate_count(self.queryset, limit, self.stored)
+
+    def keyset(self, cursor=None, backwards=False, limit=None):
+        return hydrate(keyset(
+            self.queryset.values_list('pk', flat=True),
+            cursor, backwards, limit,
+        ))
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        return hydrate(self.queryset.values_list('pk', flat=True)[index])
+
+
+def page_window(number, num_pages, on_each_side=2, on_ends=1):
+    """Номера страниц вокруг текущей и по краям, None на месте пропуска.
+
+    Для 50 страниц и текущей 25: 1, None, 23, 24, 25, 26, 27, None, 50.
+    """
+    window = range(
+        max(number - on_each_side, 1),
+        min(number + on_each_side, num_pages) + 1,
+    )
+    shown = sorted(
+        set(window)
+        | set(range(1, min(on_ends, num_pages) + 1))
+        | set(range(max(num_pages - on_ends + 1, 1), num_pages + 1))
+    )
+    previous = 0
+    for page in shown:
+        if page - previous > 1:
+            yield None
+        yield page
+        previous = page
+
+
+class FeedPaginator(Paginator):
+    """Paginator ленты с закэшированным числом постов.
+
+    Число хранится в кэше вместе с версиями областей scopes (см.
+    caching.cached_count), которые сигналы увеличивают при создании и
+    удалении постов. Считается оно через estimate_count, поэтому даже
+    промах кэша стоит один ограниченный FEED_COUNT_LIMIT запрос.
+    Уже известное вьюхе число передаётся в total и не считается вовсе.
+    """
+
+    def __init__(self, object_list, per_page, scopes=(), total=None,
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.scopes = scopes
+        self.total = total
+
+    def _estimate(self, limit=None):
+        limit = limit or settings.FEED_COUNT_LIMIT
+        if isinstance(self.object_list, QuerySet):
+            return estimate_count(self.object_list, limit)
+        return self.object_list.estimate_count(limit)
+
+    @cached_property
+    def count(self):
+        if self.total is not None:
+            return self.total
+        if not self.scopes:
+            return self._estimate()
+        return caching.cached_count(self.scopes, self._estimate)
+
+    def page(self, number):
+        """Страница; если оценка числа постов завышена и страница
+        оказалась за концом ленты, число пересчитывается точно и
+        отдаётся настоящая последняя страница."""
+        page = super().page(number)
+        if len(page) or page.number == 1:
+            return page
+        # Постов меньше, чем на предыдущих страницах, поэтому оценка
+        # с таким порогом точная.
+        count = self._estimate((page.number - 1) * self.per_page)
+        if self.scopes and self.total is None:
+            caching.store_count(self.scopes, count)
+        self.__dict__['count'] = count
+        self.__dict__.pop('num_pages', None)
+        return super().page(self.num_pages)
+
 
+def get_page(request, post_list, ranked=False, scopes=(), count=None,
+             stored=None):
+    """Страница ленты по параметрам запроса.
 
-def get_page(request, post_list):
-    paginator = Paginator(post_list, settings.NUMBER_OBJECTS)
+    Лента-QuerySet читается через PostIds: из базы только id страницы.
+    Ленты упорядочены по дате и листаются курсорами ``?after``/``?before``
+    или номером ``?page``; число постов ленты кэшируется по областям
+    scopes, если вьюха не знает его заранее (count); для длинных лент
+    оно берётся из хранимого счётчика stored (см. estimate_count). Список с
+    ``ranked=True`` (результаты поиска) сохраняет собственный порядок и
+    листается только по номеру.
+    """
+    if ranked:
+        paginator = Paginator(post_list, settings.NUMBER_OBJECTS)
+        return paginator.get_page(request.GET.get('page'))
+    if isinstance(post_list, QuerySet):
+        post_list = PostIds(post_list, stored)
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if after or before:
+        paginator = CursorPaginator(post_list, settings.NUMBER_OBJECTS)
+        return paginator.get_page(after=after, before=before)
+    paginator = FeedPaginator(
+        post_list, settings.NUMBER_OBJECTS, scopes, count
+    )
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
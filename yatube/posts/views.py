@@ -1,26 +1,49 @@
+from urllib.parse import urlencode
+
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.http import Http404
 from django.shortcuts import get_object_or_404, render, redirect
-from django.views.decorators.cache import cache_page
 
+from . import export, thumbnails
+from .caching import cache_feed, follow_scopes
+from .counters import (
+    author_stats, group_posts_total, post_stats, profile_author,
+    site_posts_total,
+)
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .groups import get_group
+from .models import Follow, Post, User
+from .recent import FollowFeed
+from .search import SearchResults
 from .utils import get_page
 
 
-@cache_page(20)
+@cache_feed('index')
 def index(request):
-    post_list = Post.objects.select_related('group', 'author')
-    page_obj = get_page(request, post_list)
+    page_obj = get_page(
+        request,
+        Post.objects.all(),
+        scopes=['index'],
+        stored=site_posts_total(),
+    )
     context = {
         'page_obj': page_obj,
     }
     return render(request, 'posts/index.html', context)
 
 
+@cache_feed('group:{slug}')
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('author')
-    page_obj = get_page(request, posts)
+    group = get_group(slug)
+    if group is None:
+        raise Http404
+    page_obj = get_page(
+        request,
+        group.posts.all(),
+        scopes=[f'group:{slug}'],
+        stored=group_posts_total(group.pk),
+    )
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -28,30 +51,69 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_feed('author:{username}')
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.select_related('group')
-    page_obj = get_page(request, post_list)
-    followers = author.following.all()
-    following = request.user.is_authenticated
-    if following:
-        following = author.following.filter(
-            user=request.user
-        )
+    author = profile_author(username, request.user)
+    if author is None:
+        raise Http404
+    page_obj = get_page(
+        request,
+        author.posts.all(),
+        scopes=[f'author:{author.username}'],
+        count=author.posts_count,
+    )
     context = {
         'page_obj': page_obj,
         'author': author,
-        'following': following,
-        'followers': followers,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@login_required
+def group_export(request, slug):
+    if not request.user.is_staff:
+        raise PermissionDenied
+    group = get_group(slug)
+    if group is None:
+        raise Http404
+    return export.export_response(
+        export.group_archive(group), request.GET.get('format'), group.slug
+    )
+
+
+@login_required
+def profile_export(request, username):
+    author = get_object_or_404(User, username=username)
+    if not (request.user.is_staff or request.user == author):
+        raise PermissionDenied
+    return export.export_response(
+        export.author_archive(author),
+        request.GET.get('format'),
+        author.username,
+    )
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    post_list = SearchResults(Post.objects.select_related('author'), query)
+    page_obj = get_page(request, post_list, ranked=True)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), id=post_id
+    )
+    comments = post.comments.select_related('author').order_by('created')
     context = {
         'post': post,
+        'author_stats': author_stats(post.author_id),
+        'post_stats': post_stats(post.pk),
         'form': CommentForm(),
         'comments': comments,
     }
@@ -68,6 +130,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.enqueue(post)
         return redirect('posts:profile', post.author)
     context = {
         'form': form,
@@ -87,6 +150,8 @@ def post_edit(request, post_id):
     )
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            thumbnails.enqueue(post)
         return redirect("posts:post_detail", post_id)
     context = {
         'form': form,
@@ -108,10 +173,11 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(
-        author__following__user=request.user
+    page_obj = get_page(
+        request,
+        FollowFeed(request.user),
+        scopes=follow_scopes(request.user),
     )
-    page_obj = get_page(request, posts)
     context = {
         'page_obj': page_obj,
     }
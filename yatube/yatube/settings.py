@@ -29,6 +29,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.metrics.MetricsMiddleware',
+    'core.middleware.profiling.ProfilingMiddleware',
+    'core.middleware.slow_queries.SlowQueryViewMiddleware',
+    'core.middleware.queries.QueryReportMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -43,7 +47,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template.backends.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -84,9 +88,20 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# MeteredCache считает попадания и промахи для метрик, а сами данные
+# хранит бэкенд из OPTIONS['BACKEND']. Кэш общий для всех воркеров узла
+# и management-команд: версии лент, справочник групп, кэш объектов и
+# списки последних постов сбрасываются через него, поэтому кэш в памяти
+# одного процесса годится только для тестов (см. settings_test).
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.metered.MeteredCache',
+        'LOCATION': 'cache/shared.cache',
+        'OPTIONS': {
+            'BACKEND': 'core.cache.shared.SharedMemoryCache',
+            'SLOTS': 4096,
+            'SLOT_SIZE': 64 * 1024,
+        },
     }
 }
 
@@ -120,3 +135,96 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+
+TIMELINE_FANOUT_LIMIT = 1000
+TIMELINE_BACKFILL = 1000
+TIMELINE_BATCH_SIZE = 500
+
+# Страница ленты живёт часы, потому что её сбрасывают версии в общем
+# кэше. Если кэш свой у каждого процесса, версию увеличит только тот
+# воркер, где изменились данные, и срок снова как у cache_page(20).
+SHARED_CACHE = (
+    CACHES['default']['OPTIONS']['BACKEND']
+    == 'core.cache.shared.SharedMemoryCache'
+)
+FEED_CACHE_TIMEOUT = 60 * 60 * 6 if SHARED_CACHE else 20
+FEED_CACHE_STALE_TIMEOUT = 60 * 10
+FEED_CACHE_LOCK_TIMEOUT = 10
+FEED_CACHE_BETA = 1.0
+
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+# Карточка с заглушкой вместо миниатюры: готовность миниатюры не входит
+# в ключ карточки, поэтому такая карточка перерисовывается часто.
+POST_CARD_PENDING_TIMEOUT = 60
+# Посты и авторы лент в общем кэше объектов.
+OBJECT_CACHE_TIMEOUT = 60 * 60 * 24
+# Первые страницы ленты подписок собираются слиянием списков последних
+# постов авторов; в списке автора FOLLOW_MERGE_PAGES * NUMBER_OBJECTS id.
+FOLLOW_MERGE_PAGES = 3
+# Подписанным на большее число авторов ленту собирает Timeline; порог
+# подобран командой follow_feed_benchmark.
+FOLLOW_MERGE_MAX_AUTHORS = 100
+# Ограничивает, сколько проживёт список, записанный читателем, который
+# загрузил его из базы одновременно с созданием поста.
+RECENT_POSTS_TIMEOUT = 60 * 5
+# До стольких постов лента считается точно, дальше — приблизительно.
+FEED_COUNT_LIMIT = 10000
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Справочник групп перечитывается не реже, чем раз в столько секунд.
+GROUP_REGISTRY_TTL = 60 * 5
+
+ADMIN_COUNT_LIMIT = 10000
+ADMIN_PREVIEW_LENGTH = 80
+
+# Столько одинаковых запросов за страницу считаются N+1.
+QUERY_REPEAT_THRESHOLD = 3
+
+INTERNAL_IPS = ['127.0.0.1']
+
+METRICS_ENABLED = True
+# Токен сборщика метрик: /metrics отдаётся с заголовком
+# «Authorization: Bearer <токен>» или сотрудникам; без токена — только им.
+METRICS_TOKEN = os.environ.get('YATUBE_METRICS_TOKEN')
+# Общий каталог воркеров: каждый пишет свой файл <pid>.json.
+METRICS_DIR = os.path.join(BASE_DIR, 'metrics')
+METRICS_FLUSH_INTERVAL = 1.0
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Доля запросов, профилируемых cProfile; 0 — только по заголовку X-Profile.
+PROFILE_SAMPLE_RATE = 0
+PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILE_KEEP = 500
+PROFILE_PRUNE_EVERY = 20
+PROFILE_TOKEN_MAX_AGE = 60 * 60
+
+SLOW_QUERY_DATABASES = ['default']
+SLOW_QUERY_THRESHOLD = 0.1
+SLOW_QUERY_STACK_DEPTH = 6
+SLOW_QUERY_LOG = os.path.join(BASE_DIR, 'slow_queries.jsonl')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'yatube.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,31 @@
+"""Настройки тестов: pytest.ini и ``manage.py test`` берут их вместо
+yatube.settings."""
+import atexit
+import os
+import shutil
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+
+# Тестовая база создаётся заново при каждом прогоне, а файл общего кэша
+# пережил бы её и отдавал записи прошлых прогонов.
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.metered.MeteredCache',
+        'OPTIONS': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+}
+# Кэш свой у процесса: срок страниц ленты как у cache_page(20).
+FEED_CACHE_TIMEOUT = 20
+
+# Метрики, профили, журнал медленных запросов и загрузки тестов пишутся
+# во временный каталог, а не в дерево исходников.
+TEST_OUTPUT_DIR = tempfile.mkdtemp(prefix='yatube-tests-')
+atexit.register(shutil.rmtree, TEST_OUTPUT_DIR, True)
+MEDIA_ROOT = os.path.join(TEST_OUTPUT_DIR, 'media')
+METRICS_DIR = os.path.join(TEST_OUTPUT_DIR, 'metrics')
+PROFILE_DIR = os.path.join(TEST_OUTPUT_DIR, 'profiles')
+SLOW_QUERY_LOG = os.path.join(TEST_OUTPUT_DIR, 'slow_queries.jsonl')
+LOGGING['handlers']['slow_queries']['filename'] = SLOW_QUERY_LOG  # noqa: F405